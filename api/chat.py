@@ -1,9 +1,16 @@
 from http.server import BaseHTTPRequestHandler
 import json
 import requests
+import math
 import os
+import sys
 from urllib.parse import parse_qs, urlparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import rate_limiter, RateLimitExceeded, client_ip
+from intents import intent_matcher
+
 class ChatHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         """Maneja las peticiones POST para el chat"""
@@ -20,6 +27,14 @@ class ChatHandler(BaseHTTPRequestHandler):
                 self.send_error_response('Mensaje requerido')
                 return
             
+            # Límite por cliente (sesión) y por IP
+            try:
+                rate_limiter.hit(request_data.get('session'), client_ip(self.client_address[0], self.headers.get('X-Forwarded-For')))
+            except RateLimitExceeded as e:
+                retry_after = math.ceil(e.retry_after)
+                self.send_error_response(rate_limit_message(retry_after), 429, {'Retry-After': str(retry_after)})
+                return
+            
             # Procesar el mensaje (versión simplificada)
             response = self.process_message(user_message)
             
@@ -48,27 +63,27 @@ class ChatHandler(BaseHTTPRequestHandler):
     def process_message(self, message: str) -> str:
         """Procesa el mensaje del usuario y genera una respuesta"""
         
-        # Respuestas predefinidas para diferentes tipos de preguntas
-        message_lower = message.lower()
+        # Respuestas predefinidas para diferentes tipos de preguntas (una sola pasada sobre el mensaje)
+        topics = intent_matcher.classify(message).intents
         
         # Preguntas sobre programación
-        if any(word in message_lower for word in ['python', 'código', 'code', 'programación']):
+        if 'programming' in topics:
             return "¡Excelente pregunta sobre programación! 🐍\n\nEn Vercel, este chatbot funciona como una API REST. Puedes hacer preguntas sobre:\n• Conceptos de programación\n• Mejores prácticas\n• Patrones de diseño\n• Debugging\n\n¿En qué lenguaje específico te gustaría que te ayude?"
         
         # Preguntas sobre el chatbot
-        elif any(word in message_lower for word in ['chatbot', 'bot', 'ayuda', 'help']):
+        elif 'chatbot' in topics:
             return "🤖 **Smart Chatbot en Vercel**\n\nEste es tu asistente de programación funcionando en la nube. Aunque no tengo acceso a Ollama aquí, puedo ayudarte con:\n\n✅ **Conceptos de programación**\n✅ **Mejores prácticas**\n✅ **Análisis de código**\n✅ **Solución de problemas**\n\n¿Qué te gustaría aprender hoy?"
         
         # Preguntas sobre GitHub
-        elif any(word in message_lower for word in ['github', 'repo', 'repositorio']):
+        elif 'github' in topics:
             return "🔗 **GitHub Integration**\n\nPara conectar tu repositorio de GitHub, necesitarás:\n\n1. **Token de GitHub** con permisos `repo`\n2. **Configurar variables de entorno** en Vercel\n3. **URL de tu repositorio**\n\n¿Te gustaría que te explique cómo configurar esto paso a paso?"
         
         # Preguntas sobre Ollama
-        elif any(word in message_lower for word in ['ollama', 'modelo', 'ia', 'ai']):
+        elif 'ollama' in topics:
             return "🧠 **Ollama en Vercel**\n\nEn Vercel no puedo ejecutar Ollama directamente, pero puedo:\n\n✅ **Explicar conceptos de IA**\n✅ **Ayudarte con prompts**\n✅ **Recomendar modelos**\n✅ **Explicar cómo funciona**\n\n¿Te gustaría que te explique cómo configurar Ollama en tu PC local o en la nube?"
         
         # Preguntas sobre Vercel
-        elif any(word in message_lower for word in ['vercel', 'deploy', 'nube', 'cloud']):
+        elif 'vercel' in topics:
             return "☁️ **Vercel Deployment**\n\n¡Excelente! Tu chatbot está funcionando en Vercel. Aquí tienes:\n\n✅ **API REST funcional**\n✅ **Deploy automático**\n✅ **HTTPS gratuito**\n✅ **CDN global**\n\nPara funcionalidades completas (WebSockets, Ollama), considera Railway o Render."
         
         # Respuesta por defecto
@@ -92,11 +107,13 @@ class ChatHandler(BaseHTTPRequestHandler):
         
         self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
     
-    def send_error_response(self, message, status_code=400):
+    def send_error_response(self, message, status_code=400, headers=None):
         """Envía una respuesta de error"""
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         
         response = {
@@ -133,6 +150,21 @@ def handler(request, context):
                     })
                 }
             
+            # Límite por cliente (sesión) y por IP
+            try:
+                rate_limiter.hit(body.get('session'), client_ip(getattr(request, 'remote_addr', None), request.headers.get('X-Forwarded-For')))
+            except RateLimitExceeded as e:
+                retry_after = math.ceil(e.retry_after)
+                return {
+                    'statusCode': 429,
+                    'headers': {'Retry-After': str(retry_after)},
+                    'body': json.dumps({
+                        'success': False,
+                        'error': rate_limit_message(retry_after),
+                        'retry_after': retry_after
+                    })
+                }
+            
             # Procesar mensaje
             response = process_message(user_message)
             
@@ -181,30 +213,34 @@ def handler(request, context):
             })
         }
 
+def rate_limit_message(retry_after: int) -> str:
+    """Mensaje para el cliente que superó el límite de peticiones"""
+    return f'Demasiadas solicitudes. Inténtalo de nuevo en {retry_after} s.'
+
 def process_message(message: str) -> str:
     """Procesa el mensaje del usuario y genera una respuesta"""
     
-    # Respuestas predefinidas para diferentes tipos de preguntas
-    message_lower = message.lower()
+    # Respuestas predefinidas para diferentes tipos de preguntas (una sola pasada sobre el mensaje)
+    topics = intent_matcher.classify(message).intents
     
     # Preguntas sobre programación
-    if any(word in message_lower for word in ['python', 'código', 'code', 'programación']):
+    if 'programming' in topics:
         return "¡Excelente pregunta sobre programación! 🐍\n\nEn Vercel, este chatbot funciona como una API REST. Puedes hacer preguntas sobre:\n• Conceptos de programación\n• Mejores prácticas\n• Patrones de diseño\n• Debugging\n\n¿En qué lenguaje específico te gustaría que te ayude?"
     
     # Preguntas sobre el chatbot
-    elif any(word in message_lower for word in ['chatbot', 'bot', 'ayuda', 'help']):
+    elif 'chatbot' in topics:
         return "🤖 **Smart Chatbot en Vercel**\n\nEste es tu asistente de programación funcionando en la nube. Aunque no tengo acceso a Ollama aquí, puedo ayudarte con:\n\n✅ **Conceptos de programación**\n✅ **Mejores prácticas**\n✅ **Análisis de código**\n✅ **Solución de problemas**\n\n¿Qué te gustaría aprender hoy?"
     
     # Preguntas sobre GitHub
-    elif any(word in message_lower for word in ['github', 'repo', 'repositorio']):
+    elif 'github' in topics:
         return "🔗 **GitHub Integration**\n\nPara conectar tu repositorio de GitHub, necesitarás:\n\n1. **Token de GitHub** con permisos `repo`\n2. **Configurar variables de entorno** en Vercel\n3. **URL de tu repositorio**\n\n¿Te gustaría que te explique cómo configurar esto paso a paso?"
     
     # Preguntas sobre Ollama
-    elif any(word in message_lower for word in ['ollama', 'modelo', 'ia', 'ai']):
+    elif 'ollama' in topics:
         return "🧠 **Ollama en Vercel**\n\nEn Vercel no puedo ejecutar Ollama directamente, pero puedo:\n\n✅ **Explicar conceptos de IA**\n✅ **Ayudarte con prompts**\n✅ **Recomendar modelos**\n✅ **Explicar cómo funciona**\n\n¿Te gustaría que te explique cómo configurar Ollama en tu PC local o en la nube?"
     
     # Preguntas sobre Vercel
-    elif any(word in message_lower for word in ['vercel', 'deploy', 'nube', 'cloud']):
+    elif 'vercel' in topics:
         return "☁️ **Vercel Deployment**\n\n¡Excelente! Tu chatbot está funcionando en Vercel. Aquí tienes:\n\n✅ **API REST funcional**\n✅ **Deploy automático**\n✅ **HTTPS gratuito**\n✅ **CDN global**\n\nPara funcionalidades completas (WebSockets, Ollama), considera Railway o Render."
     
     # Respuesta por defecto
@@ -0,0 +1,313 @@
+"""
+Preguntas en lote sobre un repositorio: JSONL de entrada, JSONL de respuestas, reanudable
+
+Cada línea de entrada es un objeto con un identificador ("id" o "request_id")
+y la pregunta ("message", "question", o "title" + "body", como requests.jsonl).
+Las respuestas se añaden al archivo de salida a medida que terminan; al volver
+a ejecutar con la misma salida se saltan las preguntas ya respondidas y se
+reintentan las que fallaron (la última línea de cada id es la que vale).
+
+Uso:
+    python batch.py --input requests.jsonl --output answers.jsonl --repo https://github.com/owner/repo
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import config
+from serialization import dumps, loads
+
+JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Responde una pregunta: (respuesta, None) o (None, error)
+AnswerFunction = Callable[[str], Awaitable[Tuple[Optional[str], Optional[str]]]]
+
+
+class BatchError(Exception):
+    """Entrada de lote inválida"""
+
+
+@dataclass
+class BatchItem:
+    id: str
+    question: str
+
+
+def parse_item(record: Any, position: int) -> BatchItem:
+    """Convertir una línea (objeto o texto) en una pregunta con identificador"""
+    if isinstance(record, str):
+        record = {"message": record}
+    if not isinstance(record, dict):
+        raise BatchError(f"Línea {position}: se esperaba un objeto JSON")
+    item_id = record.get("id") or record.get("request_id") or f"line-{position}"
+    question = record.get("message") or record.get("question")
+    if not question and (record.get("title") or record.get("body")):
+        question = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+    if not question or not str(question).strip():
+        raise BatchError(f"Línea {position}: falta la pregunta")
+    return BatchItem(str(item_id), str(question))
+
+
+def parse_items(records: Iterable[Any]) -> List[BatchItem]:
+    """Validar todas las preguntas y comprobar que los identificadores no se repiten"""
+    items: List[BatchItem] = []
+    seen: Set[str] = set()
+    for position, record in enumerate(records, start=1):
+        item = parse_item(record, position)
+        if item.id in seen:
+            raise BatchError(f"Línea {position}: identificador repetido {item.id!r}")
+        seen.add(item.id)
+        items.append(item)
+    return items
+
+
+def read_items(path: str) -> List[BatchItem]:
+    """Leer un archivo JSONL de preguntas"""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_items(loads(line) for line in f if line.strip())
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Identificadores ya respondidos sin error en un archivo de salida existente"""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = loads(line)
+            except ValueError:
+                continue  # última línea a medio escribir cuando se interrumpió el proceso
+            if result.get("error"):
+                done.discard(result.get("id"))
+            else:
+                done.add(result.get("id"))
+    return done
+
+
+class BatchJob:
+    """Responde las preguntas pendientes con `concurrency` generaciones a la vez"""
+
+    def __init__(self, job_id: str, items: List[BatchItem], output_path: str, answer: AnswerFunction,
+                 concurrency: int):
+        self.job_id = job_id
+        self.items = items
+        self.output_path = output_path
+        self.answer = answer
+        self.concurrency = max(1, concurrency)
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self) -> "BatchJob":
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            done = await asyncio.to_thread(completed_ids, self.output_path)
+            pending = [item for item in self.items if item.id not in done]
+            self.skipped = len(self.items) - len(pending)
+
+            directory = os.path.dirname(self.output_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            queue = iter(pending)
+            with open(self.output_path, "a", encoding="utf-8") as output:
+                # Workers fijos sacando de un iterador: no se crean cientos de tareas de golpe
+                workers = [asyncio.create_task(self._worker(queue, output)) for _ in range(self.concurrency)]
+                try:
+                    await asyncio.gather(*workers)
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+        return self
+
+    async def _worker(self, queue, output):
+        for item in queue:
+            started = time.perf_counter()
+            try:
+                response, error = await self.answer(item.question)
+            except Exception as e:
+                response, error = None, f"❌ Error inesperado: {str(e)}"
+            if error:
+                self.failed += 1
+            else:
+                self.completed += 1
+            result = {
+                "id": item.id,
+                "question": item.question,
+                "response": response,
+                "error": error,
+                "elapsed": round(time.perf_counter() - started, 3),
+            }
+            # Una línea completa por resultado, en disco antes de pasar a la siguiente pregunta
+            output.write(dumps(result) + "\n")
+            output.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Progreso del lote"""
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "total": len(self.items),
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "remaining": len(self.items) - self.skipped - self.completed - self.failed,
+            "concurrency": self.concurrency,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BatchManager:
+    """Lotes lanzados desde la API; la entrada se guarda junto a la salida para poder reanudarlos"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._jobs: Dict[str, BatchJob] = {}
+
+    def input_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.input.jsonl")
+
+    def output_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.jsonl")
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self._jobs.get(job_id)
+
+    def check_new(self, job_id: str):
+        """Un lote con preguntas nuevas no puede reutilizar un job_id: sus respuestas antiguas se tomarían por nuevas"""
+        if not JOB_ID_PATTERN.match(job_id):
+            raise BatchError("Identificador de lote inválido")
+        if os.path.exists(self.input_path(job_id)) or os.path.exists(self.output_path(job_id)):
+            raise BatchError(f"El lote {job_id} ya existe: reanúdalo sin enviar preguntas o usa otro job_id")
+
+    def saved_items(self, job_id: str) -> List[BatchItem]:
+        """Preguntas guardadas de un lote lanzado antes"""
+        if not JOB_ID_PATTERN.match(job_id):
+            raise BatchError("Identificador de lote inválido")
+        if not os.path.exists(self.input_path(job_id)):
+            raise BatchError(f"No existe el lote {job_id}")
+        return read_items(self.input_path(job_id))
+
+    def pending_count(self, job_id: str) -> int:
+        """Preguntas de un lote guardado que aún no tienen respuesta"""
+        done = completed_ids(self.output_path(job_id))
+        return sum(1 for item in self.saved_items(job_id) if item.id not in done)
+
+    def start(self, items: Optional[List[BatchItem]], answer: AnswerFunction, concurrency: int,
+              job_id: Optional[str] = None) -> BatchJob:
+        """Lanzar un lote nuevo (con un job_id sin usar), o reanudar `job_id` con su entrada guardada si no se envían preguntas"""
+        job_id = job_id or uuid.uuid4().hex
+        if not JOB_ID_PATTERN.match(job_id):
+            raise BatchError("Identificador de lote inválido")
+        running = self._jobs.get(job_id)
+        if running and running.state in ("pending", "running"):
+            raise BatchError(f"El lote {job_id} ya está en curso")
+
+        os.makedirs(self.directory, exist_ok=True)
+        if items is None:
+            items = self.saved_items(job_id)
+        else:
+            self.check_new(job_id)
+            with open(self.input_path(job_id), "w", encoding="utf-8") as f:
+                for item in items:
+                    f.write(dumps({"id": item.id, "message": item.question}) + "\n")
+
+        job = BatchJob(job_id, items, self.output_path(job_id), answer, concurrency)
+        job.task = asyncio.create_task(job.run())
+        self._jobs[job_id] = job
+        return job
+
+    async def aclose(self):
+        """Detener los lotes en curso; se reanudan después con el mismo job_id"""
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Instancia global de los lotes lanzados por la API
+batch_manager = BatchManager(config.BATCH_DIR)
+
+
+def batch_concurrency(requested: Optional[int] = None) -> int:
+    """Generaciones simultáneas de un lote: nunca más que la capacidad del planificador"""
+    limit = config.MAX_CONCURRENT_GENERATIONS
+    return max(1, min(requested or config.BATCH_CONCURRENCY or limit, limit))
+
+
+async def run_cli(args) -> BatchJob:
+    # Importación diferida: el CLI usa el mismo pipeline que el servidor, en este proceso
+    import main as app_module
+
+    await app_module.startup()
+    try:
+        repo = None
+        if args.repo:
+            repo, error = await app_module.open_batch_repo(args.repo)
+            if error:
+                raise SystemExit(error)
+        answer = app_module.batch_answerer(repo)
+        job = BatchJob("cli", read_items(args.input), args.output, answer, batch_concurrency(args.concurrency))
+
+        run = asyncio.create_task(job.run())
+        try:
+            while not run.done():
+                await asyncio.wait([run], timeout=args.progress)
+                stats = job.stats()
+                print(f"{stats['completed'] + stats['failed']}/{stats['total'] - stats['skipped']} "
+                      f"({stats['failed']} con error, {stats['skipped']} ya respondidas)", flush=True)
+        finally:
+            # Cancelar antes de cerrar los clientes: las preguntas a medias no se escriben como errores
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+        return run.result()
+    finally:
+        await app_module.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="JSONL con las preguntas")
+    parser.add_argument("--output", required=True, help="JSONL de respuestas (se reanuda si ya existe)")
+    parser.add_argument("--repo", help="URL del repositorio de GitHub usado como contexto")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="generaciones simultáneas (por defecto BATCH_CONCURRENCY, como máximo MAX_CONCURRENT_GENERATIONS)")
+    parser.add_argument("--progress", type=float, default=5.0, help="segundos entre informes de progreso")
+    args = parser.parse_args()
+
+    try:
+        job = asyncio.run(run_cli(args))
+    except KeyboardInterrupt:
+        print(f"Interrumpido: vuelve a ejecutar con --output {args.output} para continuar")
+        raise SystemExit(130)
+    print(f"Lote {job.state}: {job.completed} respondidas, {job.failed} con error, {job.skipped} saltadas -> {args.output}")
+    if job.error:
+        raise SystemExit(job.error)
+
+
+if __name__ == "__main__":
+    main()
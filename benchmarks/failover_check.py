@@ -0,0 +1,166 @@
+"""
+Comprobación de la conmutación entre servidores de Ollama: un stub vivo y una URL muerta
+
+Fase 1 (sin chequeo activo): la URL muerta va primera en OLLAMA_BASE_URLS, así
+que los streams se abren contra ella, fallan antes del primer token y se
+reintentan en el stub hasta que acumula OLLAMA_MAX_FAILURES fallos. Se
+comprueba que todas las respuestas llegan completas y que /api/health marca el
+servidor muerto como no sano y deja de intentarlo en cada pregunta.
+
+Fase 2 (con chequeo activo): el servidor muerto se levanta a mitad de la
+prueba y se comprueba que el chequeo (/api/ps) lo devuelve a la rotación.
+
+Termina con código 1 si alguna comprobación falla.
+
+Uso:
+    python benchmarks/failover_check.py
+    python benchmarks/failover_check.py --messages 10 --max-failures 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import run_load  # noqa: E402
+from run_benchmark import BENCH_DIR, free_port, start, stop, wait_ready  # noqa: E402
+
+
+def app_env(app_port: int, base_urls: List[str], health_interval: float, max_failures: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="chatbot-failover-")
+    return dict(
+        os.environ,
+        OLLAMA_BASE_URL=base_urls[0],
+        OLLAMA_BASE_URLS=",".join(base_urls),
+        OLLAMA_ROUTING="least_outstanding",
+        OLLAMA_HEALTH_INTERVAL=str(health_interval),
+        OLLAMA_MAX_FAILURES=str(max_failures),
+        MAX_CONCURRENT_GENERATIONS="4",
+        GITHUB_TOKEN="",
+        REPO_SNAPSHOT_DIR=os.path.join(workdir, "snapshots"),
+        EMBEDDING_DIR=os.path.join(workdir, "embeddings"),
+        GITHUB_CACHE_FILE="",
+        RESPONSE_CACHE_ENABLED="False",
+        RATE_LIMIT_ENABLED="False",
+        SESSION_STORE_BACKEND="memory",
+        WARMUP_REPO="",
+        LOG_FILE="",
+        LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+    )
+
+
+def start_stub(port: int):
+    return start([os.path.join(BENCH_DIR, "fake_ollama.py"), "--port", str(port), "--tokens", "20",
+                  "--token-rate", "200", "--latency", "0.05"])
+
+
+def start_app(port: int, env: dict):
+    return start(["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                  "--log-level", "warning"], env)
+
+
+def backends(app_port: int) -> Dict[str, dict]:
+    health = httpx.get(f"http://127.0.0.1:{app_port}/api/health", timeout=5.0).json()
+    return {backend["url"]: backend for backend in health["ollama_backends"]}
+
+
+def wait_for(condition: Callable[[], bool], timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def expect(self, condition: bool, description: str, detail: object = ""):
+        print(f"  {'OK ' if condition else 'FALLO'} {description}" + (f": {detail}" if detail != "" else ""), flush=True)
+        if not condition:
+            self.failed += 1
+
+
+def failover_phase(args, checks: Checks):
+    print("Fase 1: reintento antes del primer token y degradación del servidor muerto")
+    live_port, dead_port, app_port = free_port(), free_port(), free_port()
+    live, dead = f"http://127.0.0.1:{live_port}", f"http://127.0.0.1:{dead_port}"
+    processes = [start_stub(live_port)]
+    try:
+        wait_ready(f"{live}/api/tags")
+        processes.append(start_app(app_port, app_env(app_port, [dead, live], 0, args.max_failures)))
+        wait_ready(f"http://127.0.0.1:{app_port}/api/ready", require_ok=True)
+
+        # Una pregunta tras otra: sin chequeo activo, solo los fallos reales degradan al servidor muerto
+        result = asyncio.run(run_load(f"ws://127.0.0.1:{app_port}/ws", 1, args.messages, timeout=args.timeout))
+        checks.expect(not result.errors, "ningún stream termina con error", result.errors[:3] or "")
+        checks.expect(len(result.samples) == args.messages, f"{args.messages} respuestas completas", len(result.samples))
+        checks.expect(all(sample.tokens > 0 for sample in result.samples), "todas las respuestas traen tokens")
+
+        state = backends(app_port)
+        checks.expect(not state[dead]["healthy"], "/api/health marca el servidor muerto como no sano", state[dead])
+        checks.expect(state[dead]["failures"] >= args.max_failures, f"al menos {args.max_failures} fallos registrados",
+                      state[dead]["failures"])
+        checks.expect(bool(state[dead]["last_error"]), "se informa el último error", state[dead]["last_error"])
+        checks.expect(state[dead]["requests"] >= 1, "algún stream se abrió contra el servidor muerto y se reintentó",
+                      state[dead]["requests"])
+        checks.expect(state[dead]["requests"] < args.messages, "el servidor muerto deja de intentarse en cada pregunta",
+                      state[dead]["requests"])
+        checks.expect(state[live]["healthy"] and state[live]["requests"] >= args.messages,
+                      "el stub vivo atiende todas las preguntas", state[live]["requests"])
+    finally:
+        stop(processes)
+
+
+def restore_phase(args, checks: Checks):
+    print("Fase 2: el chequeo activo devuelve a la rotación un servidor recuperado")
+    live_port, dead_port, app_port = free_port(), free_port(), free_port()
+    live, dead = f"http://127.0.0.1:{live_port}", f"http://127.0.0.1:{dead_port}"
+    processes = [start_stub(live_port)]
+    try:
+        wait_ready(f"{live}/api/tags")
+        processes.append(start_app(app_port, app_env(app_port, [dead, live], 0.5, args.max_failures)))
+        wait_ready(f"http://127.0.0.1:{app_port}/api/ready", require_ok=True)
+
+        checks.expect(wait_for(lambda: not backends(app_port)[dead]["healthy"], 10), "el chequeo detecta el servidor caído")
+        processes.append(start_stub(dead_port))
+        wait_ready(f"{dead}/api/tags")
+        checks.expect(wait_for(lambda: backends(app_port)[dead]["healthy"], 10), "el chequeo lo marca sano al volver",
+                      backends(app_port)[dead])
+
+        before = backends(app_port)[dead]["requests"]
+        result = asyncio.run(run_load(f"ws://127.0.0.1:{app_port}/ws", 4, 2, timeout=args.timeout))
+        checks.expect(not result.errors, "ningún stream termina con error", result.errors[:3] or "")
+        checks.expect(backends(app_port)[dead]["requests"] > before, "el servidor recuperado vuelve a recibir preguntas",
+                      backends(app_port)[dead]["requests"] - before)
+    finally:
+        stop(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=6, help="preguntas seguidas en la fase 1")
+    parser.add_argument("--max-failures", type=int, default=3, help="OLLAMA_MAX_FAILURES de la app")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    checks = Checks()
+    failover_phase(args, checks)
+    restore_phase(args, checks)
+    print()
+    if checks.failed:
+        print(f"{checks.failed} comprobaciones fallidas")
+        raise SystemExit(1)
+    print("Conmutación correcta")
+
+
+if __name__ == "__main__":
+    main()
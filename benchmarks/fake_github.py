@@ -0,0 +1,137 @@
+"""
+Stub de la API de GitHub para benchmarks: repositorio, rama, contenidos (con ETag) y tarball
+
+Uso:
+    python benchmarks/fake_github.py --port 9500 --files 50
+"""
+import argparse
+import base64
+import hashlib
+import io
+import tarfile
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+OWNER = "bench"
+REPO = "demo"
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+def make_files(count: int) -> dict:
+    """Archivos Python sintéticos, con funciones para que el índice tenga qué buscar"""
+    files = {
+        "README.md": "# Demo\nRepositorio sintético para benchmarks.\n",
+        "main.py": "".join(f"def handler_{i}(request):\n    return process(request, {i})\n\n" for i in range(40)),
+        "config.py": "class Config:\n    PORT = 8000\n    DEBUG = False\n",
+        "requirements.txt": "fastapi\nuvicorn\n",
+    }
+    for i in range(count):
+        files[f"src/module_{i}.py"] = "".join(
+            f"def function_{i}_{j}(value):\n    \"\"\"Procesa el valor {j}\"\"\"\n    return value * {j}\n\n" for j in range(20)
+        )
+    return files
+
+
+def sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def create_app(file_count: int = 50) -> FastAPI:
+    app = FastAPI(title="Fake GitHub")
+    files = make_files(file_count)
+    tarball_cache = {}
+
+    def base_url(request: Request) -> str:
+        return str(request.base_url).rstrip("/")
+
+    def conditional(request: Request, body) -> Response:
+        etag = '"' + sha1(repr(body)) + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(body, headers={"ETag": etag})
+
+    @app.get("/repos/{owner}/{repo}")
+    async def get_repo(request: Request, owner: str, repo: str):
+        # Como GitHub: el nombre se busca sin distinguir mayúsculas y se responde el canónico
+        if (owner.lower(), repo.lower()) == (OWNER, REPO):
+            owner, repo = OWNER, REPO
+        return {
+            "id": 1,
+            "name": repo,
+            "full_name": f"{owner}/{repo}",
+            "description": "Repositorio de benchmark",
+            "language": "Python",
+            "stargazers_count": 0,
+            "forks_count": 0,
+            "size": sum(len(content) for content in files.values()) // 1024,
+            "default_branch": "main",
+            "url": f"{base_url(request)}/repos/{owner}/{repo}",
+        }
+
+    @app.get("/repos/{owner}/{repo}/branches/{branch}")
+    async def get_branch(request: Request, owner: str, repo: str, branch: str):
+        return {"name": branch, "commit": {"sha": COMMIT, "url": f"{base_url(request)}/repos/{owner}/{repo}/commits/{COMMIT}"}}
+
+    @app.get("/repos/{owner}/{repo}/contents/")
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def get_contents(request: Request, owner: str, repo: str, path: str = ""):
+        path = path.strip("/")
+        if path in files:
+            content = files[path]
+            return conditional(request, {
+                "name": path.rsplit("/", 1)[-1],
+                "path": path,
+                "type": "file",
+                "size": len(content),
+                "sha": sha1(content),
+                "encoding": "base64",
+                "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+            })
+
+        prefix = f"{path}/" if path else ""
+        entries = {}
+        for file_path, content in files.items():
+            if not file_path.startswith(prefix):
+                continue
+            name, _, rest = file_path[len(prefix):].partition("/")
+            entries[name] = {
+                "name": name,
+                "path": prefix + name,
+                "type": "dir" if rest else "file",
+                "size": 0 if rest else len(content),
+                "sha": sha1(prefix + name),
+            }
+        if not entries:
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+        return conditional(request, list(entries.values()))
+
+    @app.get("/repos/{owner}/{repo}/tarball")
+    @app.get("/repos/{owner}/{repo}/tarball/{ref}")
+    async def get_tarball(owner: str, repo: str, ref: str = "main"):
+        if "data" not in tarball_cache:
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+                for file_path, content in files.items():
+                    data = content.encode("utf-8")
+                    info = tarfile.TarInfo(f"{owner}-{repo}-{COMMIT[:7]}/{file_path}")
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            tarball_cache["data"] = buffer.getvalue()
+        return Response(tarball_cache["data"], media_type="application/x-gzip")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9500)
+    parser.add_argument("--files", type=int, default=50, help="módulos sintéticos en src/")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.files), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
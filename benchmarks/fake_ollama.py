@@ -0,0 +1,151 @@
+"""
+Stub de Ollama para benchmarks: /api/tags, /api/ps, /api/generate, /api/chat y /api/embed
+
+Genera tokens a un ritmo fijo después de una latencia inicial configurable.
+Con --load-time simula la carga del modelo: la primera petición (o la primera
+tras caducar su keep_alive) espera ese tiempo, y un /api/generate sin prompt
+solo carga el modelo, como en Ollama.
+
+Uso:
+    python benchmarks/fake_ollama.py --port 11500 --tokens 200 --token-rate 50 --latency 0.2
+    python benchmarks/fake_ollama.py --load-time 5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+MODELS = ["phi3:mini", "nomic-embed-text"]
+DEFAULT_KEEP_ALIVE = 300.0
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def keep_alive_seconds(value) -> float:
+    """Segundos de un keep_alive de Ollama (número o "30m", "1h30m"); negativo = para siempre"""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)) or str(value).lstrip("-").replace(".", "", 1).isdigit():
+        seconds = float(value)
+    else:
+        text = str(value)
+        seconds = sum(float(amount) * DURATION_UNITS[unit]
+                      for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", text))
+        if text.startswith("-"):
+            seconds = -seconds
+    return float("inf") if seconds < 0 else seconds
+
+
+def create_app(tokens: int = 200, token_rate: float = 50.0, latency: float = 0.2, load_time: float = 0.0) -> FastAPI:
+    """App con la latencia inicial (s), el ritmo (tokens/s) y la longitud de respuesta indicados"""
+    app = FastAPI(title="Fake Ollama")
+    interval = 1.0 / token_rate if token_rate > 0 else 0.0
+    # modelo -> momento en que se descarga de memoria
+    loaded: Dict[str, float] = {}
+    loading: Dict[str, asyncio.Task] = {}
+
+    async def ensure_loaded(body: dict):
+        model = body.get("model")
+        if loaded.get(model, 0) <= time.monotonic():
+            loaded.pop(model, None)
+            # Las peticiones que llegan durante la carga esperan a la misma carga
+            if model not in loading:
+                loading[model] = asyncio.create_task(asyncio.sleep(load_time))
+            try:
+                await asyncio.shield(loading[model])
+            finally:
+                loading.pop(model, None)
+        loaded[model] = time.monotonic() + keep_alive_seconds(body.get("keep_alive"))
+
+    def final_message(started: float, extra: dict) -> dict:
+        duration = max(time.perf_counter() - started - latency, 1e-9)
+        return {"done": True, "eval_count": tokens, "eval_duration": int(duration * 1e9), **extra}
+
+    async def generate_tokens():
+        await asyncio.sleep(latency)
+        for i in range(tokens):
+            yield f"tok{i} "
+            if interval:
+                await asyncio.sleep(interval)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name, "size": 0} for name in MODELS]}
+
+    @app.get("/api/ps")
+    async def ps():
+        now = time.monotonic()
+        return {"models": [{"name": name} for name, expires in loaded.items() if expires > now]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        started = time.perf_counter()
+        await ensure_loaded(body)
+        if not body.get("prompt"):
+            return {"model": body.get("model"), "response": "", "done": True, "done_reason": "load"}
+        if not body.get("stream", True):
+            text = "".join([token async for token in generate_tokens()])
+            return {"model": body.get("model"), "response": text, **final_message(started, {})}
+
+        async def stream():
+            async for token in generate_tokens():
+                yield json.dumps({"model": body.get("model"), "response": token, "done": False}) + "\n"
+            yield json.dumps({"model": body.get("model"), "response": "", **final_message(started, {})}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        started = time.perf_counter()
+        await ensure_loaded(body)
+        if not body.get("stream", True):
+            text = "".join([token async for token in generate_tokens()])
+            return {"model": body.get("model"), "message": {"role": "assistant", "content": text}, **final_message(started, {})}
+
+        async def stream():
+            async for token in generate_tokens():
+                yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+            done = final_message(started, {"message": {"role": "assistant", "content": ""}})
+            yield json.dumps({"model": body.get("model"), **done}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        await ensure_loaded(body)
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        vectors = []
+        for text in inputs:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            vectors.append([byte / 255 for byte in digest[:32]])
+        return {"model": body.get("model"), "embeddings": vectors}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--tokens", type=int, default=200, help="tokens por respuesta")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="tokens por segundo de cada stream (0 = sin espera)")
+    parser.add_argument("--latency", type=float, default=0.2, help="segundos antes del primer token")
+    parser.add_argument("--load-time", type=float, default=0.0, help="segundos que tarda en cargarse un modelo no cargado")
+    args = parser.parse_args()
+    app = create_app(args.tokens, args.token_rate, args.latency, args.load_time)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Microbenchmark del clasificador de intenciones (antes / después)
+
+Antes: lista de palabras clave construida en cada llamada, `any(...)` sobre
+message.lower() y comprobaciones sueltas de archivos (main.py), o la cadena
+de cinco `any(...)` de api/chat.py. Después: intent_matcher.classify().
+
+Uso:
+    python benchmarks/intent_bench.py [--messages 1000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intents import intent_matcher  # noqa: E402
+
+SAMPLES = [
+    "Explica qué hace la función process_chat_message del archivo main.py",
+    "hola, ¿cómo estás?",
+    "¿Por qué falla el build? Me sale un error al importar config.py en producción",
+    "Dame ideas para mejorar el rendimiento del servidor cuando hay muchos usuarios conectados a la vez",
+    "How does the websocket endpoint handle reconnects in templates/index.html?",
+    "¿Qué modelo de IA usa el chatbot y cómo lo cambio?",
+    "Quiero hacer deploy en la nube, ¿Vercel o Render?",
+    "Revisa requirements.txt y dime si falta alguna dependencia",
+    "gracias!",
+    "Necesito que me ayudes a entender la arquitectura general del proyecto y cómo se conectan los módulos entre sí, "
+    "sobre todo la parte del repositorio de GitHub y la caché",
+]
+
+
+def main_before(message: str):
+    """process_chat_message* y get_github_context antes del cambio"""
+    keywords = [
+        "archivo", "file", "código", "code", "función", "function",
+        "main.py", "config.py", "requirements.txt", "index.html",
+        "analiza", "analyze", "revisa", "review", "explica", "explain",
+        "qué hace", "what does", "cómo funciona", "how does", "error", "bug"
+    ]
+    if any(keyword in message.lower() for keyword in keywords):
+        message_lower = message.lower()
+        files = []
+        for name in ("main.py", "config.py", "requirements.txt", "index.html"):
+            if name in message_lower:
+                files.append(name)
+        return files
+    return None
+
+
+def api_before(message: str):
+    """process_message de api/chat.py antes del cambio"""
+    message_lower = message.lower()
+    if any(word in message_lower for word in ['python', 'código', 'code', 'programación']):
+        return "programming"
+    elif any(word in message_lower for word in ['chatbot', 'bot', 'ayuda', 'help']):
+        return "chatbot"
+    elif any(word in message_lower for word in ['github', 'repo', 'repositorio']):
+        return "github"
+    elif any(word in message_lower for word in ['ollama', 'modelo', 'ia', 'ai']):
+        return "ollama"
+    elif any(word in message_lower for word in ['vercel', 'deploy', 'nube', 'cloud']):
+        return "vercel"
+    return None
+
+
+def run(func, messages):
+    for message in messages:
+        func(message)
+
+
+def report(name: str, before: float, after: float, count: int):
+    per_before = before / count * 1e6
+    per_after = after / count * 1e6
+    print(f"{name:<26} antes {per_before:7.2f} µs/mensaje   después {per_after:7.2f} µs/mensaje   ({per_before / per_after:4.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = [rng.choice(SAMPLES) for _ in range(args.messages)]
+
+    def best(func):
+        return min(timeit.repeat(lambda: run(func, messages), number=1, repeat=args.repeat))
+
+    after = best(intent_matcher.classify)
+    print(f"{args.messages} mensajes de {len(SAMPLES)} tipos")
+    report("main.py (contexto + archivos)", best(main_before), after, args.messages)
+    report("api/chat.py (cinco temas)", best(api_before), after, args.messages)
+    # El clasificador responde a las dos preguntas en la misma pasada
+    report("ambos puntos de entrada", best(main_before) + best(api_before), after, args.messages)
+
+
+if __name__ == "__main__":
+    main()
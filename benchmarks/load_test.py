@@ -0,0 +1,161 @@
+"""
+Carga concurrente sobre /ws: N clientes WebSocket que preguntan a la vez
+
+Mide el tiempo hasta el primer token (TTFT), la duración total y los tokens/s
+de cada respuesta, y resume p50/p95/p99. Sirve contra cualquier servidor ya
+levantado; run_benchmark.py lo usa con los stubs de Ollama y GitHub.
+
+Uso:
+    python benchmarks/load_test.py --url ws://127.0.0.1:8000/ws --clients 20 --messages 3
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import websockets
+
+DEFAULT_QUESTION = "Explica qué hace la función handler_1 del archivo main.py"
+
+
+@dataclass
+class Sample:
+    """Una respuesta completa vista desde el cliente"""
+    ttft: float
+    total: float
+    tokens: int
+
+    @property
+    def tokens_per_second(self) -> float:
+        streaming = self.total - self.ttft
+        return self.tokens / streaming if streaming > 0 else 0.0
+
+
+@dataclass
+class LoadResult:
+    clients: int
+    wall_time: float
+    samples: List[Sample] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, float]:
+        ttfts = [s.ttft for s in self.samples]
+        totals = [s.total for s in self.samples]
+        rates = [s.tokens_per_second for s in self.samples]
+        tokens = sum(s.tokens for s in self.samples)
+        return {
+            "clients": self.clients,
+            "responses": len(self.samples),
+            "errors": len(self.errors),
+            "ttft_p50": percentile(ttfts, 50),
+            "ttft_p95": percentile(ttfts, 95),
+            "ttft_p99": percentile(ttfts, 99),
+            "total_p50": percentile(totals, 50),
+            "total_p95": percentile(totals, 95),
+            "total_p99": percentile(totals, 99),
+            "stream_tok_s_p50": percentile(rates, 50),
+            "aggregate_tok_s": tokens / self.wall_time if self.wall_time > 0 else 0.0,
+        }
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Percentil por rango más cercano (0 si no hay muestras)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def ask(ws, question: str, timeout: float) -> Sample:
+    """Enviar una pregunta y leer hasta response_end"""
+    started = time.perf_counter()
+    await ws.send(json.dumps({"type": "chat", "message": question}))
+    ttft: Optional[float] = None
+    parts: List[str] = []
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+        kind = message.get("type")
+        if kind == "response_chunk":
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(message.get("content", ""))
+        elif kind == "response_end":
+            # Un response_end con contenido es un error, ocupado o cancelación
+            if message.get("content"):
+                raise RuntimeError(message["content"])
+            total = time.perf_counter() - started
+            return Sample(ttft if ttft is not None else total, total, len("".join(parts).split()))
+
+
+async def run_client(url: str, index: int, messages: int, question: str, repo_url: Optional[str],
+                     timeout: float, result: LoadResult):
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=timeout) as ws:
+            await asyncio.wait_for(ws.recv(), timeout)  # mensaje "session"
+            if repo_url:
+                await ws.send(json.dumps({"type": "github_connect", "repo_url": repo_url}))
+                while json.loads(await asyncio.wait_for(ws.recv(), timeout)).get("type") != "github_status":
+                    pass
+            for turn in range(messages):
+                # Preguntas distintas por cliente: si no, single-flight las uniría en un solo stream
+                sample = await ask(ws, f"{question} #{index}-{turn}", timeout)
+                result.samples.append(sample)
+    except Exception as e:
+        result.errors.append(f"cliente {index}: {type(e).__name__}: {e}")
+
+
+async def run_load(url: str, clients: int, messages: int = 1, question: str = DEFAULT_QUESTION,
+                   repo_url: Optional[str] = None, timeout: float = 120.0) -> LoadResult:
+    """Lanzar `clients` conexiones simultáneas, cada una con `messages` preguntas seguidas"""
+    result = LoadResult(clients=clients, wall_time=0.0)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(url, i, messages, question, repo_url, timeout, result) for i in range(clients)
+    ))
+    result.wall_time = time.perf_counter() - started
+    return result
+
+
+def format_table(rows: Sequence[Dict[str, float]]) -> str:
+    columns = [
+        ("clients", "clientes", "{:d}"),
+        ("responses", "resp", "{:d}"),
+        ("errors", "errores", "{:d}"),
+        ("ttft_p50", "ttft p50", "{:.3f}"),
+        ("ttft_p95", "ttft p95", "{:.3f}"),
+        ("ttft_p99", "ttft p99", "{:.3f}"),
+        ("total_p50", "total p50", "{:.3f}"),
+        ("total_p95", "total p95", "{:.3f}"),
+        ("total_p99", "total p99", "{:.3f}"),
+        ("stream_tok_s_p50", "tok/s p50", "{:.1f}"),
+        ("aggregate_tok_s", "tok/s total", "{:.1f}"),
+    ]
+    header = " ".join(f"{title:>11}" for _, title, _ in columns)
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(" ".join(f"{fmt.format(row[key]):>11}" for key, _, fmt in columns))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=1, help="preguntas por cliente")
+    parser.add_argument("--question", default=DEFAULT_QUESTION)
+    parser.add_argument("--repo-url", help="conectar este repositorio antes de preguntar")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args.url, args.clients, args.messages, args.question, args.repo_url, args.timeout))
+    print(format_table([result.summary()]))
+    for error in result.errors[:10]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    main()
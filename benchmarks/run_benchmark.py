@@ -0,0 +1,158 @@
+"""
+Benchmark de extremo a extremo: stubs de Ollama y GitHub + la app real + carga creciente
+
+Levanta fake_ollama.py, fake_github.py y `uvicorn main:app` como subprocesos,
+aplica niveles crecientes de clientes concurrentes sobre /ws y reporta TTFT,
+tokens/s, p50/p95/p99 y el máximo de conexiones sostenibles: el mayor nivel
+sin errores cuyo TTFT p95 no supera --ttft-slo.
+
+La configuración de la app (MAX_CONCURRENT_GENERATIONS, STREAM_FLUSH_INTERVAL,
+...) se toma del entorno, así que se pueden comparar ajustes entre ejecuciones.
+La carga empieza cuando /api/ready responde 200, como haría un balanceador;
+con --load-time y WARMUP_ENABLED=False se mide lo que paga el primer usuario.
+
+Uso:
+    python benchmarks/run_benchmark.py --levels 1,5,10,25,50 --tokens 200 --token-rate 50 --latency 0.2
+    python benchmarks/run_benchmark.py --with-repo --messages 2 --ttft-slo 1.5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_github import OWNER, REPO  # noqa: E402
+from load_test import format_table, run_load  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30.0, require_ok: bool = False):
+    """Esperar a que un servidor responda en `url` (con `require_ok`, con un 200)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if not require_ok or response.status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió a tiempo: {url}")
+
+
+def start(args: List[str], env: Optional[dict] = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT_DIR, env=env)
+
+
+def stop(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def ramp(url: str, levels: List[int], args) -> List[dict]:
+    rows = []
+    repo_url = f"https://github.com/{OWNER}/{REPO}" if args.with_repo else None
+    for clients in levels:
+        result = await run_load(url, clients, args.messages, repo_url=repo_url, timeout=args.timeout)
+        row = result.summary()
+        rows.append(row)
+        print(f"  {clients} clientes: ttft p95 {row['ttft_p95']:.3f} s, {row['errors']} errores", flush=True)
+        for error in result.errors[:3]:
+            print(f"    {error}", flush=True)
+    return rows
+
+
+def max_sustainable(rows: List[dict], ttft_slo: float) -> int:
+    """Mayor nivel que cumple el SLO; la rampa se corta en el primer nivel que falla"""
+    best = 0
+    for row in rows:
+        if row["errors"] or row["ttft_p95"] > ttft_slo:
+            break
+        best = row["clients"]
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,5,10,25,50", help="clientes concurrentes por nivel")
+    parser.add_argument("--messages", type=int, default=1, help="preguntas por cliente en cada nivel")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens por respuesta del stub")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="tokens/s de cada stream del stub")
+    parser.add_argument("--latency", type=float, default=0.2, help="latencia del stub antes del primer token (s)")
+    parser.add_argument("--load-time", type=float, default=0.0, help="tiempo de carga del modelo en el stub (s)")
+    parser.add_argument("--files", type=int, default=50, help="módulos del repositorio stub")
+    parser.add_argument("--with-repo", action="store_true", help="conectar el repositorio stub en cada cliente")
+    parser.add_argument("--ttft-slo", type=float, default=2.0, help="TTFT p95 máximo aceptable (s)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    ollama_port, github_port, app_port = free_port(), free_port(), free_port()
+    workdir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    env = dict(
+        os.environ,
+        HOST="127.0.0.1",
+        PORT=str(app_port),
+        OLLAMA_BASE_URL=f"http://127.0.0.1:{ollama_port}",
+        OLLAMA_BASE_URLS="",
+        GITHUB_API_URL=f"http://127.0.0.1:{github_port}",
+        GITHUB_TOKEN=os.environ.get("BENCH_GITHUB_TOKEN", "ghp_benchmark"),
+        REPO_SNAPSHOT_DIR=os.path.join(workdir, "snapshots"),
+        EMBEDDING_DIR=os.path.join(workdir, "embeddings"),
+        GITHUB_CACHE_FILE="",
+        RESPONSE_CACHE_ENABLED="False",
+        RATE_LIMIT_ENABLED="False",
+        SESSION_STORE_BACKEND="memory",
+        LOG_FILE="",
+        LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+    )
+
+    processes = [
+        start([os.path.join(BENCH_DIR, "fake_ollama.py"), "--port", str(ollama_port), "--tokens", str(args.tokens),
+               "--token-rate", str(args.token_rate), "--latency", str(args.latency),
+               "--load-time", str(args.load_time)]),
+        start([os.path.join(BENCH_DIR, "fake_github.py"), "--port", str(github_port), "--files", str(args.files)]),
+    ]
+    try:
+        wait_ready(f"http://127.0.0.1:{ollama_port}/api/tags")
+        wait_ready(f"http://127.0.0.1:{github_port}/repos/{OWNER}/{REPO}")
+        processes.append(start(["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                                "--log-level", "warning"], env))
+        wait_ready(f"http://127.0.0.1:{app_port}/api/ready", timeout=30.0 + args.load_time, require_ok=True)
+
+        print(f"Stub: {args.tokens} tokens a {args.token_rate} tok/s tras {args.latency} s; "
+              f"MAX_CONCURRENT_GENERATIONS={os.environ.get('MAX_CONCURRENT_GENERATIONS', 'por defecto')}")
+        rows = asyncio.run(ramp(f"ws://127.0.0.1:{app_port}/ws", levels, args))
+    finally:
+        stop(processes)
+
+    print()
+    print(format_table(rows))
+    print()
+    print(f"Máximo de conexiones sostenibles (TTFT p95 <= {args.ttft_slo} s, sin errores): "
+          f"{max_sustainable(rows, args.ttft_slo)}")
+
+
+if __name__ == "__main__":
+    main()
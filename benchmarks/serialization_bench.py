@@ -0,0 +1,102 @@
+"""
+Microbenchmark del costo por token de serialización (antes / después)
+
+Uso:
+    python benchmarks/serialization_bench.py [--tokens 1000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization  # noqa: E402
+from serialization import encode_chunk_frame, iter_ndjson, loads  # noqa: E402
+
+
+def make_ndjson(tokens: int) -> bytes:
+    """Respuesta de /api/chat simulada, como la envía Ollama"""
+    lines = [
+        json.dumps({
+            "model": "phi3:mini",
+            "created_at": "2024-01-01T00:00:00.000000Z",
+            "message": {"role": "assistant", "content": f"token{i} "},
+            "done": False,
+        })
+        for i in range(tokens)
+    ]
+    lines.append(json.dumps({"model": "phi3:mini", "message": {"role": "assistant", "content": ""}, "done": True}))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def split_network_chunks(body: bytes, size: int = 4096):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+async def network(chunks):
+    for data in chunks:
+        yield data
+
+
+async def parse_before(chunks):
+    """Antes: decodificar a str, partir en líneas y json.loads"""
+    pending = ""
+    async for data in network(chunks):
+        text = pending + data.decode("utf-8")
+        *lines, pending = text.split("\n")
+        for line in lines:
+            if line:
+                json.loads(line)
+
+
+async def parse_after(chunks):
+    """Después: líneas en bytes decodificadas directamente"""
+    async for _ in iter_ndjson(network(chunks)):
+        pass
+
+
+def frames_before(tokens):
+    for token in tokens:
+        json.dumps({"type": "response_chunk", "content": token})
+
+
+def frames_after(tokens):
+    for token in tokens:
+        encode_chunk_frame(token)
+
+
+def report(name: str, before: float, after: float, tokens: int):
+    per_before = before / tokens * 1e6
+    per_after = after / tokens * 1e6
+    print(f"{name:<22} antes {per_before:7.2f} µs/token   después {per_after:7.2f} µs/token   ({per_before / per_after:4.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = split_network_chunks(make_ndjson(args.tokens))
+    tokens = [loads(line)["message"]["content"] for line in b"".join(chunks).splitlines()]
+
+    def best(func, *func_args):
+        return min(timeit.repeat(lambda: func(*func_args), number=1, repeat=args.repeat))
+
+    def best_async(func, *func_args):
+        loop = asyncio.new_event_loop()
+        try:
+            return best(lambda: loop.run_until_complete(func(*func_args)))
+        finally:
+            loop.close()
+
+    print(f"Serializador: {serialization.BACKEND}, {args.tokens} tokens")
+    report("NDJSON de Ollama", best_async(parse_before, chunks), best_async(parse_after, chunks), args.tokens)
+    report("Mensajes WebSocket", best(frames_before, tokens), best(frames_after, tokens), args.tokens)
+
+
+if __name__ == "__main__":
+    main()
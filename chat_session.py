@@ -0,0 +1,45 @@
+"""
+Sesiones de chat por conexión con historial acotado
+"""
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config import config
+
+
+class ChatSession:
+    """Historial de una conversación, enviado como prefijo estable a /api/chat"""
+
+    def __init__(self, history_limit: Optional[int] = None, session_id: Optional[str] = None):
+        self.session_id = session_id
+        self.history_limit = history_limit or config.CHAT_HISTORY_LIMIT
+        # Se guarda el mensaje del usuario sin el contexto del repositorio: así el
+        # prefijo (system + turnos anteriores) no cambia y Ollama reutiliza su caché KV
+        self.history: Deque[Dict[str, str]] = deque(maxlen=self.history_limit)
+        # Repositorio conectado ("owner/name"); cada sesión tiene el suyo
+        self.repo_name: Optional[str] = None
+        # RepoContext cargado en este proceso (no se guarda en el almacén)
+        self.repo = None
+
+    def turns(self) -> List[Dict[str, str]]:
+        """Mensajes anteriores, del más antiguo al más reciente"""
+        return list(self.history)
+
+    def record(self, user_message: str, assistant_message: str):
+        """Agregar un turno completo al historial"""
+        self.history.append({"role": "user", "content": user_message})
+        self.history.append({"role": "assistant", "content": assistant_message})
+
+    def clear(self):
+        """Olvidar la conversación"""
+        self.history.clear()
+
+    def to_state(self) -> Dict[str, Any]:
+        """Estado serializable para el almacén de sesiones"""
+        return {"repo": self.repo_name, "history": self.turns()}
+
+    def restore(self, state: Dict[str, Any]):
+        """Recuperar el estado guardado por otra conexión (o por otro worker)"""
+        self.repo_name = state.get("repo")
+        self.history.clear()
+        self.history.extend(state.get("history", []))
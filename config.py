@@ -2,11 +2,15 @@
 Configuración centralizada para Smart Chatbot
 """
 import os
+import re
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Duración de keep_alive al estilo de Ollama: segundos ("300", "-1") o "30m", "1h30m", "90s"
+KEEP_ALIVE_PATTERN = re.compile(r"^-?(\d+(\.\d+)?|(\d+(\.\d+)?(ms|s|m|h))+)$")
+
 class Config:
     """Configuración centralizada del chatbot"""
     
@@ -19,23 +23,95 @@ class Config:
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", 30))
     OLLAMA_DEFAULT_MODEL = os.getenv("OLLAMA_DEFAULT_MODEL", "auto")
+    OLLAMA_CONNECT_TIMEOUT = int(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5))
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", 20))
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 10))
+    OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", 30))
+    OLLAMA_MODELS_TTL = int(os.getenv("OLLAMA_MODELS_TTL", 60))
+    OLLAMA_CONTEXT_TOKENS = int(os.getenv("OLLAMA_CONTEXT_TOKENS", 4096))
+    OLLAMA_MODEL_CONTEXT = os.getenv("OLLAMA_MODEL_CONTEXT", "")  # p. ej. "phi3:mini=4096,llama3=8192"
+    OLLAMA_RESPONSE_TOKENS = int(os.getenv("OLLAMA_RESPONSE_TOKENS", 1024))
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # "-1" = siempre cargado; vacío = valor de Ollama
+    
+    # Varios servidores de Ollama (balanceo de carga)
+    OLLAMA_BASE_URLS = os.getenv("OLLAMA_BASE_URLS", "")  # separados por comas; vacío = OLLAMA_BASE_URL
+    OLLAMA_ROUTING = os.getenv("OLLAMA_ROUTING", "least_outstanding")  # least_outstanding o model_affinity
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", 15))
+    OLLAMA_MAX_FAILURES = int(os.getenv("OLLAMA_MAX_FAILURES", 3))
+    
+    # Calentamiento al arrancar: el modelo se carga antes de declarar la instancia lista
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() == "true"
+    WARMUP_REPO = os.getenv("WARMUP_REPO", "")  # URL de GitHub a descargar al arrancar (opcional)
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 300))  # segundos por intento de carga del modelo
+    WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", 10))
     
     # Configuración de GitHub
     GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+    GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")  # GitHub Enterprise o un stub local
     GITHUB_REPO = os.getenv("GITHUB_REPO", "username/repository")
     GITHUB_TIMEOUT = int(os.getenv("GITHUB_TIMEOUT", 10))
+    GITHUB_CACHE_MAX_ENTRIES = int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", 256))
+    GITHUB_CACHE_FILE = os.getenv("GITHUB_CACHE_FILE", "")
+    REPO_SNAPSHOT_DIR = os.getenv("REPO_SNAPSHOT_DIR", ".cache/snapshots")
+    REPO_SNAPSHOT_MAX_FILE_BYTES = int(os.getenv("REPO_SNAPSHOT_MAX_FILE_BYTES", 1_000_000))
+    REPO_SNAPSHOT_RETENTION = float(os.getenv("REPO_SNAPSHOT_RETENTION", 3600))  # segundos que se conservan los commits anteriores
+    REPO_CONTEXT_TTL = float(os.getenv("REPO_CONTEXT_TTL", 300))  # segundos hasta buscar nuevos commits
+    REPO_CONTEXT_MAX_ENTRIES = int(os.getenv("REPO_CONTEXT_MAX_ENTRIES", 64))
+    
+    # Configuración de recuperación de contexto
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 6))
+    RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 1500))
+    RETRIEVAL_CHUNK_LINES = int(os.getenv("RETRIEVAL_CHUNK_LINES", 40))
+    RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", 10))
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bm25")  # bm25 o semantic
+    OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+    EMBEDDING_DIR = os.getenv("EMBEDDING_DIR", ".cache/embeddings")
     
     # Configuración del chat
     MAX_MESSAGE_LENGTH = int(os.getenv("MAX_MESSAGE_LENGTH", 1000))
     CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", 100))
     
+    # Caché de respuestas (opcional)
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "False").lower() == "true"
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory o sqlite
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+    RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", ".cache/responses.sqlite3")
+    
+    # Almacén de sesiones (memoria o SQLite compartido entre workers)
+    SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")  # memory o sqlite
+    SESSION_STORE_DB = os.getenv("SESSION_STORE_DB", ".cache/sessions.sqlite3")
+    SESSION_TTL = int(os.getenv("SESSION_TTL", 86400))
+    SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 10000))
+    
+    # Planificador de generaciones
+    MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", 2))
+    GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", 16))
+    
+    # Agrupación de trozos en el streaming hacia el navegador
+    STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", 0.03))  # segundos
+    STREAM_FLUSH_MAX_CHARS = int(os.getenv("STREAM_FLUSH_MAX_CHARS", 512))
+    
+    # Preguntas en lote
+    BATCH_DIR = os.getenv("BATCH_DIR", ".cache/batches")
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 0))  # 0 = MAX_CONCURRENT_GENERATIONS
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 100))  # por petición a /api/batch
+    
     # Configuración de seguridad
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
     RATE_LIMIT = os.getenv("RATE_LIMIT", "100/minute")
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_PER_IP = os.getenv("RATE_LIMIT_PER_IP", "")  # vacío = mismo límite que RATE_LIMIT
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory o sqlite
+    RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", ".cache/ratelimit.sqlite3")
+    RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))
+    RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "False").lower() == "true"  # usar X-Forwarded-For
     
     # Configuración de logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE = os.getenv("LOG_FILE", "smart-chatbot.log")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text o json
     
     @classmethod
     def validate(cls):
@@ -45,6 +121,57 @@ class Config:
         if not cls.OLLAMA_BASE_URL:
             errors.append("OLLAMA_BASE_URL no está configurado")
         
+        if cls.OLLAMA_ROUTING not in ("least_outstanding", "model_affinity"):
+            errors.append("OLLAMA_ROUTING debe ser 'least_outstanding' o 'model_affinity'")
+        
+        if cls.OLLAMA_MAX_CONNECTIONS < 1:
+            errors.append("OLLAMA_MAX_CONNECTIONS debe ser al menos 1")
+        
+        if cls.OLLAMA_RESPONSE_TOKENS >= cls.OLLAMA_CONTEXT_TOKENS:
+            errors.append("OLLAMA_RESPONSE_TOKENS debe ser menor que OLLAMA_CONTEXT_TOKENS")
+        
+        if cls.OLLAMA_KEEP_ALIVE and not KEEP_ALIVE_PATTERN.match(cls.OLLAMA_KEEP_ALIVE.strip()):
+            errors.append("OLLAMA_KEEP_ALIVE debe ser un número de segundos o una duración como '30m' o '1h'")
+        
+        if cls.WARMUP_TIMEOUT <= 0 or cls.WARMUP_RETRY_INTERVAL <= 0:
+            errors.append("WARMUP_TIMEOUT y WARMUP_RETRY_INTERVAL deben ser mayores que 0")
+        
+        if cls.RETRIEVAL_CHUNK_OVERLAP >= cls.RETRIEVAL_CHUNK_LINES:
+            errors.append("RETRIEVAL_CHUNK_OVERLAP debe ser menor que RETRIEVAL_CHUNK_LINES")
+        
+        if cls.RETRIEVAL_MODE not in ("bm25", "semantic"):
+            errors.append("RETRIEVAL_MODE debe ser 'bm25' o 'semantic'")
+        
+        if cls.RESPONSE_CACHE_BACKEND not in ("memory", "sqlite"):
+            errors.append("RESPONSE_CACHE_BACKEND debe ser 'memory' o 'sqlite'")
+        
+        if cls.SESSION_STORE_BACKEND not in ("memory", "sqlite"):
+            errors.append("SESSION_STORE_BACKEND debe ser 'memory' o 'sqlite'")
+        
+        if cls.MAX_CONCURRENT_GENERATIONS < 1:
+            errors.append("MAX_CONCURRENT_GENERATIONS debe ser al menos 1")
+        
+        if cls.GENERATION_QUEUE_SIZE < 0:
+            errors.append("GENERATION_QUEUE_SIZE no puede ser negativo")
+        
+        if cls.BATCH_CONCURRENCY < 0:
+            errors.append("BATCH_CONCURRENCY no puede ser negativo")
+        
+        if cls.BATCH_MAX_QUESTIONS < 1:
+            errors.append("BATCH_MAX_QUESTIONS debe ser al menos 1")
+        
+        if cls.STREAM_FLUSH_INTERVAL < 0:
+            errors.append("STREAM_FLUSH_INTERVAL no puede ser negativo")
+        
+        if cls.RATE_LIMIT_BACKEND not in ("memory", "sqlite"):
+            errors.append("RATE_LIMIT_BACKEND debe ser 'memory' o 'sqlite'")
+        
+        if cls.LOG_LEVEL.upper() not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+            errors.append("LOG_LEVEL debe ser DEBUG, INFO, WARNING, ERROR o CRITICAL")
+        
+        if cls.LOG_FORMAT not in ("text", "json"):
+            errors.append("LOG_FORMAT debe ser 'text' o 'json'")
+        
         if cls.GITHUB_TOKEN and not (cls.GITHUB_TOKEN.startswith("ghp_") or cls.GITHUB_TOKEN.startswith("github_pat_")):
             errors.append("GITHUB_TOKEN parece ser inválido")
         
@@ -60,6 +187,42 @@ class Config:
         endpoint = endpoint.lstrip("/")
         return f"{base}/{endpoint}" if endpoint else base
     
+    @classmethod
+    def get_ollama_base_urls(cls) -> list:
+        """Lista de servidores de Ollama entre los que se reparte la carga"""
+        urls = [url.strip().rstrip("/") for url in cls.OLLAMA_BASE_URLS.split(",") if url.strip()]
+        return urls or [cls.OLLAMA_BASE_URL.rstrip("/")]
+    
+    @classmethod
+    def get_model_context_tokens(cls, model: str) -> int:
+        """Obtener el tamaño de contexto configurado para un modelo"""
+        overrides = {}
+        for item in cls.OLLAMA_MODEL_CONTEXT.split(","):
+            if "=" in item:
+                name, tokens = item.split("=", 1)
+                overrides[name.strip()] = int(tokens)
+        if model in overrides:
+            return overrides[model]
+        return overrides.get(model.split(":")[0], cls.OLLAMA_CONTEXT_TOKENS)
+    
+    @classmethod
+    def get_prompt_budget(cls, model: str) -> int:
+        """Tokens disponibles para el prompt (contexto menos la reserva de respuesta)"""
+        return cls.get_model_context_tokens(model) - cls.OLLAMA_RESPONSE_TOKENS
+    
+    @classmethod
+    def get_model_options(cls, model: str) -> dict:
+        """Opciones de generación de Ollama para un modelo"""
+        return {"num_ctx": cls.get_model_context_tokens(model)}
+    
+    @classmethod
+    def get_keep_alive(cls):
+        """keep_alive para las peticiones a Ollama: entero (segundos), duración en texto o None"""
+        keep_alive = cls.OLLAMA_KEEP_ALIVE.strip()
+        if not keep_alive:
+            return None
+        return int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+    
     @classmethod
     def is_github_enabled(cls) -> bool:
         """Verificar si GitHub está habilitado"""
@@ -96,6 +259,7 @@ Si no estás seguro de algo, sé honesto al respecto."""
             "port": cls.PORT,
             "debug": cls.DEBUG,
             "ollama_url": cls.OLLAMA_BASE_URL,
+            "ollama_urls": cls.get_ollama_base_urls(),
             "github_enabled": cls.is_github_enabled(),
             "max_message_length": cls.MAX_MESSAGE_LENGTH,
             "chat_history_limit": cls.CHAT_HISTORY_LIMIT
@@ -0,0 +1,210 @@
+"""
+Búsqueda semántica de código con embeddings de Ollama y un almacén vectorial NumPy
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from config import config
+from ollama_client import OllamaClient, ollama_client
+from prompt_builder import estimate_tokens
+from retrieval import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_hash(chunk: Chunk) -> str:
+    """Hash del contenido embebido de un fragmento"""
+    return hashlib.sha1(f"{chunk.path}\n{chunk.text}".encode("utf-8")).hexdigest()
+
+
+class VectorState(NamedTuple):
+    """Matriz, hashes de sus filas y fragmentos; se reemplaza entera, nunca se modifica"""
+    matrix: Optional[np.ndarray]
+    hashes: List[str]
+    rows: Dict[str, int]
+    chunks: Dict[str, Chunk]
+
+
+EMPTY_STATE = VectorState(None, [], {}, {})
+
+
+class VectorStore:
+    """Matriz contigua de embeddings normalizados, persistida como .npy
+
+    Las búsquedas leen `state` una sola vez; una reconstrucción prepara el
+    estado nuevo aparte y lo publica con una sola asignación.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.state = EMPTY_STATE
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self.state.matrix
+
+    @property
+    def hashes(self) -> List[str]:
+        return self.state.hashes
+
+    @property
+    def vectors_file(self) -> str:
+        return os.path.join(self.directory, "vectors.npy")
+
+    @property
+    def meta_file(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def load(self) -> bool:
+        """Mapear en memoria la matriz guardada en disco"""
+        if not (os.path.exists(self.vectors_file) and os.path.exists(self.meta_file)):
+            return False
+        with open(self.meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != config.OLLAMA_EMBED_MODEL:
+            return False  # Embeddings de otro modelo: no son comparables
+        hashes = meta["hashes"]
+        matrix = np.load(self.vectors_file, mmap_mode="r")
+        self.state = VectorState(matrix, hashes, {h: row for row, h in enumerate(hashes)}, self.state.chunks)
+        return True
+
+    def save(self, matrix: np.ndarray, hashes: List[str]):
+        """Guardar la matriz en disco"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_vectors = os.path.join(self.directory, "vectors.tmp.npy")
+        np.save(tmp_vectors, matrix)
+        with open(f"{self.meta_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": config.OLLAMA_EMBED_MODEL, "hashes": hashes}, f)
+        os.replace(tmp_vectors, self.vectors_file)
+        os.replace(f"{self.meta_file}.tmp", self.meta_file)
+
+    def missing(self, chunks: List[Chunk]) -> List[Chunk]:
+        """Fragmentos cuyo contenido aún no tiene embedding"""
+        rows = self.state.rows
+        seen = set()
+        result = []
+        for chunk in chunks:
+            h = chunk_hash(chunk)
+            if h not in rows and h not in seen:
+                seen.add(h)
+                result.append(chunk)
+        return result
+
+    def rebuild(self, chunks: List[Chunk], new_vectors: Dict[str, np.ndarray]):
+        """Reconstruir la matriz con los fragmentos actuales, reutilizando filas existentes"""
+        current = self.state
+        by_hash: Dict[str, Chunk] = {}
+        for chunk in chunks:
+            by_hash.setdefault(chunk_hash(chunk), chunk)
+
+        if not new_vectors and set(by_hash) == set(current.hashes):
+            # Mismo contenido: solo se asocian los fragmentos, sin reescribir la matriz
+            self.state = current._replace(chunks=by_hash)
+            return
+
+        hashes = list(by_hash)
+        rows = [new_vectors[h] if h in new_vectors else current.matrix[current.rows[h]] for h in hashes]
+        if rows:
+            matrix = np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        rows = None
+        state = VectorState(matrix, hashes, {h: row for row, h in enumerate(hashes)}, by_hash)
+        # Las búsquedas pasan a la matriz en memoria antes de reemplazar el archivo mapeado
+        self.state = state
+        self.save(matrix, hashes)
+        self.state = state._replace(matrix=np.load(self.vectors_file, mmap_mode="r"))
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Chunk]:
+        """Top-k por similitud coseno, sin bucles de Python sobre los fragmentos"""
+        state = self.state
+        if state.matrix is None or not len(state.hashes) or not state.chunks:
+            return []
+        scores = state.matrix @ query_vector
+        k = min(k, scores.shape[0])
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [state.chunks[state.hashes[row]] for row in top if state.hashes[row] in state.chunks]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class SemanticIndexStore:
+    """Un almacén vectorial por repositorio, embebido con Ollama"""
+
+    def __init__(self, client: OllamaClient, base_dir: str):
+        self.client = client
+        self.base_dir = base_dir
+        self._stores: Dict[str, VectorStore] = {}
+        # Una actualización por repositorio a la vez; las siguientes encuentran el trabajo hecho
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def get(self, repo_name: str) -> Optional[VectorStore]:
+        """Obtener el almacén de un repositorio"""
+        return self._stores.get(repo_name)
+
+    def _store_for(self, repo_name: str) -> VectorStore:
+        store = self._stores.get(repo_name)
+        if store is None:
+            store = VectorStore(os.path.join(self.base_dir, repo_name.replace("/", "__")))
+            store.load()
+            self._stores[repo_name] = store
+        return store
+
+    def load_all(self):
+        """Mapear en memoria todos los almacenes guardados"""
+        if not os.path.isdir(self.base_dir):
+            return
+        for entry in os.listdir(self.base_dir):
+            self._store_for(entry.replace("__", "/", 1))
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embeber textos en lotes de EMBEDDING_BATCH_SIZE"""
+        vectors = []
+        for start in range(0, len(texts), config.EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + config.EMBEDDING_BATCH_SIZE]
+            vectors.extend(await self.client.embed(config.OLLAMA_EMBED_MODEL, batch))
+        return normalize(np.asarray(vectors, dtype=np.float32))
+
+    async def update(self, repo_name: str, chunks: List[Chunk]) -> VectorStore:
+        """Embeber solo los fragmentos nuevos o modificados"""
+        store = self._store_for(repo_name)
+        async with self._locks.setdefault(repo_name, asyncio.Lock()):
+            missing = store.missing(chunks)
+            new_vectors: Dict[str, np.ndarray] = {}
+            if missing:
+                matrix = await self.embed([f"{chunk.path}\n{chunk.text}" for chunk in missing])
+                new_vectors = {chunk_hash(chunk): matrix[i] for i, chunk in enumerate(missing)}
+            await asyncio.to_thread(store.rebuild, chunks, new_vectors)
+        logger.info("Embeddings de %s: %d fragmentos (%d nuevos)", repo_name, len(store.hashes), len(missing))
+        return store
+
+    async def select(self, repo_name: str, query: str, k: int, token_budget: int) -> List[Chunk]:
+        """Elegir los fragmentos más similares sin exceder el presupuesto de tokens"""
+        store = self._stores.get(repo_name)
+        if store is None:
+            return []
+        query_vector = (await self.embed([query]))[0]
+        selected = []
+        used = 0
+        for chunk in store.search(query_vector, k):
+            cost = estimate_tokens(chunk.text)
+            if used + cost > token_budget:
+                continue
+            selected.append(chunk)
+            used += cost
+        return selected
+
+
+# Instancia global de índices semánticos
+semantic_store = SemanticIndexStore(ollama_client, config.EMBEDDING_DIR)
@@ -0,0 +1,173 @@
+"""
+Caché LRU de contenidos de GitHub con revalidación condicional (ETag/SHA)
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from github import GithubException
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class GitHubContentCache:
+    """Cachea archivos y listados por (repo, ref, path, sha) y los revalida con If-None-Match"""
+
+    def __init__(self, max_entries: int = 256, cache_file: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_file = cache_file
+        # (repo, ref, path, sha) -> contenido decodificado o listado
+        self._entries: "OrderedDict[Tuple[str, str, str, str], Any]" = OrderedDict()
+        # (repo, ref, path) -> (etag, sha) de la última versión conocida
+        self._validators: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def _request(self, repo, path: str, ref: str, etag: Optional[str]):
+        """GET condicional a la API de contenidos de GitHub"""
+        headers = {"If-None-Match": etag} if etag else {}
+        status, response_headers, output = repo._requester.requestJson(
+            "GET",
+            f"{repo.url}/contents/{urllib.parse.quote(path)}",
+            parameters={"ref": ref},
+            headers=headers,
+        )
+        if status == 304:
+            return status, response_headers, None
+
+        data = json.loads(output) if output else None
+        if status >= 400:
+            raise GithubException(status, data, response_headers)
+        return status, response_headers, data
+
+    def _lookup(self, repo, path: str, ref: Optional[str], parse) -> Any:
+        ref = ref or repo.default_branch
+        location = (repo.full_name, ref, path)
+
+        with self._lock:
+            etag, sha = self._validators.get(location, (None, None))
+            if (*location, sha) not in self._entries:
+                etag = None
+
+        status, response_headers, data = self._request(repo, path, ref, etag)
+
+        if status == 304:
+            with self._lock:
+                key = (*location, sha)
+                if key in self._entries:
+                    self.hits += 1
+                    self.revalidations += 1
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            # La entrada fue desalojada mientras se revalidaba
+            status, response_headers, data = self._request(repo, path, ref, None)
+
+        sha, value = parse(data)
+        key = (*location, sha)
+
+        with self._lock:
+            self._validators[location] = (response_headers.get("etag", ""), sha)
+
+            if key in self._entries:
+                # El ETag cambió pero el blob es el mismo: no hace falta decodificar de nuevo
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            self.misses += 1
+            self._store(key, value)
+            return value
+
+    def _store(self, key: Tuple[str, str, str, str], value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            location = evicted[:3]
+            if self._validators.get(location, (None, None))[1] == evicted[3]:
+                del self._validators[location]
+
+    @staticmethod
+    def _parse_file(data: Any) -> Tuple[str, Optional[str]]:
+        if isinstance(data, list) or data.get("type") != "file":
+            return data.get("sha", "") if isinstance(data, dict) else "", None
+        content = base64.b64decode(data.get("content") or "").decode("utf-8", errors="replace")
+        return data["sha"], content
+
+    @staticmethod
+    def _parse_listing(data: Any) -> Tuple[str, List[Dict[str, Any]]]:
+        items = data if isinstance(data, list) else [data]
+        listing = [
+            {"name": item["name"], "path": item["path"], "type": item["type"], "size": item.get("size", 0), "sha": item["sha"]}
+            for item in items
+        ]
+        # Un listado no tiene SHA propio: se usa un hash de los SHAs de sus entradas
+        sha = hashlib.sha1("".join(item["sha"] for item in listing).encode()).hexdigest()
+        return sha, listing
+
+    def get_file(self, repo, path: str, ref: Optional[str] = None) -> Optional[str]:
+        """Obtener el contenido decodificado de un archivo (None si no es un archivo)"""
+        return self._lookup(repo, path, ref, self._parse_file)
+
+    def get_listing(self, repo, path: str = "", ref: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Obtener el listado de un directorio del repositorio"""
+        return self._lookup(repo, path, ref, self._parse_listing)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de aciertos y fallos de la caché"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "entries": len(self._entries),
+        }
+
+    def load(self):
+        """Cargar la caché desde disco, si está configurada"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo cargar la caché de GitHub: %s", e)
+            return
+
+        with self._lock:
+            for repo_name, ref, path, sha, etag, value in saved.get("entries", []):
+                self._store((repo_name, ref, path, sha), value)
+                if etag:
+                    self._validators[(repo_name, ref, path)] = (etag, sha)
+
+    def save(self):
+        """Guardar la caché en disco, si está configurada"""
+        if not self.cache_file:
+            return
+
+        with self._lock:
+            entries = []
+            for key, value in self._entries.items():
+                etag, sha = self._validators.get(key[:3], ("", ""))
+                entries.append([*key, etag if sha == key[3] else "", value])
+
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"entries": entries}, f)
+        os.replace(tmp_file, self.cache_file)
+
+
+# Instancia global de la caché
+github_cache = GitHubContentCache(config.GITHUB_CACHE_MAX_ENTRIES, config.GITHUB_CACHE_FILE or None)
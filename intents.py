@@ -0,0 +1,140 @@
+"""
+Clasificador de intenciones: vocabulario de palabras clave construido al importar el módulo
+
+Cada palabra del mensaje se busca una sola vez en un conjunto que reúne las
+palabras clave de todas las intenciones (una intersección de conjuntos, en C);
+solo las palabras con signos pegados ("¿qué", "main.py,") pasan por Python.
+Las raíces de verbo ("explic*" cubre "explícame", "explicar", "explicación")
+se buscan con una sola expresión regular sobre el mensaje.
+"""
+import re
+from typing import Dict, FrozenSet, List, NamedTuple, Sequence, Set, Tuple
+
+# Candidatos a ruta dentro de un mensaje: "main.py", "templates/index.html", "src/app"
+PATH_PATTERN = re.compile(r"[\w.-]+(?:/[\w.-]+)*\.\w+|[\w.-]+(?:/[\w.-]+)+")
+# Números y versiones ("1.5", "v3.11.7") que PATH_PATTERN tomaría por rutas
+VERSION_PATTERN = re.compile(r"v?\d+(?:\.\d+)+")
+
+# Intenciones y sus palabras clave. Las palabras coinciden completas; las de más
+# de 3 letras también con las terminaciones de INFLECTIONS ("errores", "files").
+# Las terminadas en "*" son raíces: coinciden con el principio de cualquier
+# palabra, sin tildes, para los imperativos con pronombre ("revísame",
+# "analízalo"). Las frases de varias palabras se buscan tal cual
+INTENTS: Dict[str, Tuple[str, ...]] = {
+    # Preguntas sobre el código del repositorio conectado
+    "code": (
+        "archivo", "file", "código", "code", "función", "funciones", "function",
+        "main.py", "config.py", "requirements.txt", "index.html",
+        "analiz*", "analyze", "revis*", "review", "explic*", "explain", "debug*",
+        "qué hace", "what does", "cómo funciona", "how does", "error", "bug", "bugs",
+    ),
+    # Temas de las respuestas predefinidas de api/chat.py
+    "programming": ("python", "código", "code", "programación"),
+    "chatbot": ("chatbot", "bot", "ayuda", "help"),
+    "github": ("github", "repo", "repositorio"),
+    "ollama": ("ollama", "modelo", "ia", "ai"),
+    "vercel": ("vercel", "deploy", "nube", "cloud"),
+}
+
+INFLECTIONS = ("", "s", "es", "r")
+EXACT_MAX_LENGTH = 3
+
+# Signos que pueden ir pegados a una palabra; "." y "/" se conservan al inicio por las rutas
+LEADING_PUNCTUATION = ",;:!?¿¡()[]{}<>\"'`*“”‘’«»"
+TRAILING_PUNCTUATION = LEADING_PUNCTUATION + "."
+
+# Vocales con tilde -> sin tilde, para comparar con las raíces
+ACCENT_FOLD = str.maketrans("áéíóúü", "aeiouu")
+ACCENT_CLASSES = {"a": "[aá]", "e": "[eé]", "i": "[ií]", "o": "[oó]", "u": "[uúü]"}
+
+
+class MessageIntents(NamedTuple):
+    """Resultado de clasificar un mensaje"""
+    intents: FrozenSet[str]
+    keywords: FrozenSet[str]
+    files: Tuple[str, ...]
+
+
+def normalize_path(candidate: str) -> str:
+    """Ruta mencionada en minúsculas, sin "./" inicial ni punto final"""
+    candidate = candidate.lower().rstrip(".")
+    return candidate[2:] if candidate.startswith("./") else candidate
+
+
+class IntentMatcher:
+    """Encuentra en una pasada todas las intenciones, palabras clave y rutas de un mensaje"""
+
+    def __init__(self, intents: Dict[str, Sequence[str]]):
+        by_keyword: Dict[str, Set[str]] = {}
+        for name, keywords in intents.items():
+            for keyword in keywords:
+                by_keyword.setdefault(" ".join(keyword.lower().split()), set()).add(name)
+
+        # forma escrita -> palabra clave; rutas por nombre de archivo; frases por su primera palabra
+        self._forms: Dict[str, str] = {}
+        self._files: Dict[str, str] = {}
+        self._phrases: Dict[str, List[str]] = {}
+        self._stems: Dict[str, str] = {}
+        for keyword in by_keyword:
+            if keyword.endswith("*"):
+                self._stems[keyword[:-1].translate(ACCENT_FOLD)] = keyword
+            elif " " in keyword:
+                first = keyword.split(" ", 1)[0]
+                self._phrases.setdefault(first, []).append(keyword)
+            elif PATH_PATTERN.fullmatch(keyword):
+                self._files[keyword] = keyword
+            elif len(keyword) <= EXACT_MAX_LENGTH:
+                self._forms[keyword] = keyword
+            else:
+                for suffix in INFLECTIONS:
+                    self._forms.setdefault(keyword + suffix, keyword)
+        self._intents = {keyword: frozenset(names) for keyword, names in by_keyword.items()}
+        self._vocabulary = frozenset(self._forms) | frozenset(self._phrases)
+        # Raíces al principio de una palabra, con o sin tilde: "revísame", "analízalo"
+        self._stem_pattern = re.compile(r"(?<!\w)(?:%s)" % "|".join(
+            "".join(ACCENT_CLASSES.get(char, re.escape(char)) for char in stem)
+            for stem in sorted(self._stems, key=len, reverse=True)
+        )) if self._stems else None
+
+    def classify(self, message: str) -> MessageIntents:
+        """Intenciones, palabras clave y rutas mencionadas"""
+        lower = message.lower()
+        words = lower.split()
+        hits = set(self._vocabulary.intersection(words))
+        files: List[str] = []
+        for word in words:
+            if word.isalnum():
+                continue  # ya resuelta por la intersección
+            word = word.lstrip(LEADING_PUNCTUATION).rstrip(TRAILING_PUNCTUATION)
+            if word in self._vocabulary:
+                hits.add(word)
+            elif (("." in word or "/" in word) and PATH_PATTERN.fullmatch(word)
+                  and not VERSION_PATTERN.fullmatch(word)):
+                path = normalize_path(word)
+                if path not in files:
+                    files.append(path)
+
+        keywords: Set[str] = set()
+        if self._stem_pattern is not None:
+            for match in self._stem_pattern.findall(lower):
+                keywords.add(self._stems[match.translate(ACCENT_FOLD)])
+
+        for hit in hits:
+            if hit in self._forms:
+                keywords.add(self._forms[hit])
+            for phrase in self._phrases.get(hit, ()):
+                if phrase in lower:
+                    keywords.add(phrase)
+        for path in files:
+            name = path.rsplit("/", 1)[-1]
+            if name in self._files:
+                keywords.add(self._files[name])
+
+        intents: FrozenSet[str] = frozenset()
+        for keyword in keywords:
+            intents |= self._intents[keyword]
+        return MessageIntents(intents, frozenset(keywords), tuple(files))
+
+
+# Instancia global, construida una sola vez
+intent_matcher = IntentMatcher(INTENTS)
@@ -1,21 +1,61 @@
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 # from fastapi.staticfiles import StaticFiles  # Not needed
 from fastapi.templating import Jinja2Templates
 import uvicorn
-import json
 import asyncio
-import requests
+import logging
+import math
+import time
+import httpx
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from github import Github
 import aiofiles
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pydantic import BaseModel, Field
 
 # Import configuration
 from config import config
+from ollama_client import ollama_client, OllamaError
+from model_registry import model_registry, ModelNotAvailableError
+from github_cache import github_cache
+from prompt_builder import PromptBuilder, BuiltPrompt, estimate_tokens
+from chat_session import ChatSession
+from repo_context import RepoContext, repo_contexts
+from logging_config import configure_logging, shutdown_logging, new_request_id
+from metrics import (
+    registry, GITHUB_CONTEXT_SECONDS, PROMPT_TOKENS, TIME_TO_FIRST_TOKEN_SECONDS,
+    TOKENS_PER_SECOND, GENERATION_SECONDS, WEBSOCKET_SEND_SECONDS, RESPONSES_TOTAL
+)
+from session_store import session_store, new_session_id, is_valid_session_id
+from response_cache import response_cache
+from embeddings import semantic_store
+from single_flight import single_flight
+from stream_batching import batch_chunks
+from serialization import dumps, loads, encode_chunk_frame
+from scheduler import generation_scheduler, QueueFullError, PositionCallback
+from rate_limit import rate_limiter, RateLimitExceeded, client_ip
+from intents import intent_matcher, MessageIntents
+from batch import batch_manager, batch_concurrency, parse_items, AnswerFunction, BatchError, JOB_ID_PATTERN
+from warmup import warmup, WarmupStep
 
-app = FastAPI(title="Smart Chatbot", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load caches, warm the instance up in the background and clean up on exit"""
+    await startup()
+    # Connections are accepted right away; /api/ready reports when the model is loaded
+    warmup.start(warmup_steps())
+    try:
+        yield
+    finally:
+        await shutdown()
+
+app = FastAPI(title="Smart Chatbot", version="1.0.0", lifespan=lifespan)
 
 # Mount static files (commented out - not needed for this chatbot)
 # app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -23,11 +63,18 @@ app = FastAPI(title="Smart Chatbot", version="1.0.0")
 # Templates
 templates = Jinja2Templates(directory="templates")
 
-# GitHub client and active repository
+# GitHub client (each session keeps its own repository)
 github_client = None
-active_repo = None
 if config.is_github_enabled():
-    github_client = Github(config.GITHUB_TOKEN)
+    github_client = Github(config.GITHUB_TOKEN, base_url=config.GITHUB_API_URL)
+
+# Files that can be read without a snapshot, by the name users mention them with
+KNOWN_FILES = {
+    "main.py": "main.py",
+    "config.py": "config.py",
+    "requirements.txt": "requirements.txt",
+    "index.html": "templates/index.html",
+}
 
 class ConnectionManager:
     def __init__(self):
@@ -38,13 +85,111 @@ class ConnectionManager:
         self.active_connections.append(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
+        start = time.perf_counter()
         await websocket.send_text(message)
+        WEBSOCKET_SEND_SECONDS.observe(time.perf_counter() - start)
 
 manager = ConnectionManager()
 
+class ChatChannel:
+    """Where the chat pipeline delivers an answer: the same frames go to WebSocket and SSE clients"""
+    def __init__(self):
+        self.error: Optional[str] = None
+        self.status_code = 200
+
+    async def send(self, frame: str):
+        raise NotImplementedError
+
+    async def chunk(self, text: str):
+        await self.send(encode_chunk_frame(text))
+
+    async def queue_position(self, position: int):
+        await self.send(dumps({
+            "type": "queue_position",
+            "position": position,
+            "content": f"⏳ En cola: posición {position}"
+        }))
+
+    async def end(self, error: str = "", status_code: int = 200):
+        """Finish the answer; a non-empty `error` is shown to the user instead"""
+        self.error = error or None
+        self.status_code = status_code
+        await self.send(dumps({
+            "type": "response_end",
+            "content": error
+        }))
+
+class WebSocketChannel(ChatChannel):
+    def __init__(self, websocket: WebSocket):
+        super().__init__()
+        self.websocket = websocket
+
+    async def send(self, frame: str):
+        await manager.send_personal_message(frame, self.websocket)
+
+class EventStreamChannel(ChatChannel):
+    """Frames queued for a Server-Sent Events response; None marks the end of the stream"""
+    def __init__(self):
+        super().__init__()
+        self.frames: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def send(self, frame: str):
+        self.frames.put_nowait(frame)
+
+    def close(self):
+        self.frames.put_nowait(None)
+
+class CollectingChannel(ChatChannel):
+    """Accumulates the answer for a plain JSON response (no frames are encoded)"""
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+
+    async def send(self, frame: str):
+        pass
+
+    async def chunk(self, text: str):
+        self.parts.append(text)
+
+    async def queue_position(self, position: int):
+        pass
+
+    async def end(self, error: str = "", status_code: int = 200):
+        self.error = error or None
+        self.status_code = status_code
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=config.MAX_MESSAGE_LENGTH)
+    session: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    # Omit the questions to resume a previous job_id from its saved input
+    questions: Optional[List[Union[str, Dict[str, Any]]]] = Field(None, max_length=config.BATCH_MAX_QUESTIONS)
+    repo_url: Optional[str] = None
+    job_id: Optional[str] = None
+    concurrency: Optional[int] = Field(None, ge=1)
+
+# Gauges and counters read at scrape time, so they cost nothing per request
+registry.gauge("chatbot_active_connections", "Conexiones WebSocket abiertas", lambda: len(manager.active_connections))
+registry.gauge("chatbot_generations_in_flight", "Generaciones en curso en Ollama", lambda: generation_scheduler.in_flight)
+registry.gauge("chatbot_generation_queue_depth", "Generaciones esperando turno", lambda: generation_scheduler.stats()["queued"])
+registry.gauge("chatbot_ready", "1 si la instancia terminó el calentamiento y acepta tráfico", lambda: float(is_ready()))
+registry.counter_function("chatbot_generations_rejected_total", "Generaciones rechazadas por cola llena", lambda: generation_scheduler.rejected)
+registry.counter_function("chatbot_rate_limited_total", "Mensajes rechazados por límite de peticiones", lambda: rate_limiter.limited)
+registry.counter_function("chatbot_generations_coalesced_total", "Preguntas unidas a una generación en curso", lambda: single_flight.coalesced)
+registry.counter_function("chatbot_response_cache_hits_total", "Aciertos de la caché de respuestas", lambda: response_cache.hits)
+registry.counter_function("chatbot_response_cache_misses_total", "Fallos de la caché de respuestas", lambda: response_cache.misses)
+registry.counter_function("chatbot_github_cache_hits_total", "Aciertos de la caché de GitHub", lambda: github_cache.hits)
+registry.counter_function("chatbot_github_cache_misses_total", "Fallos de la caché de GitHub", lambda: github_cache.misses)
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -52,15 +197,48 @@ async def root(request: Request):
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    # Generation runs as its own task so it can be aborted while we keep reading the socket
+    generation: Optional[asyncio.Task] = None
     try:
+        session = await open_session(websocket.query_params.get("session"))
+        # Tell the client which session to resume after a reconnect (possibly on another worker)
+        await manager.send_personal_message(
+            dumps({
+                "type": "session",
+                "session_id": session.session_id,
+                "repo": session.repo_name
+            }), 
+            websocket
+        )
+        ip = client_ip(websocket.client.host if websocket.client else None, websocket.headers.get("x-forwarded-for"))
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = loads(data)
             
             if message_data["type"] == "chat":
+                # Rejected messages leave the answer in progress untouched
+                try:
+                    await rate_limiter.acquire(session.session_id, ip)
+                except RateLimitExceeded as e:
+                    retry_after = math.ceil(e.retry_after)
+                    await manager.send_personal_message(
+                        dumps({
+                            "type": "rate_limited",
+                            "retry_after": retry_after,
+                            "content": f"⏳ Has enviado demasiados mensajes. Inténtalo de nuevo en {retry_after} s."
+                        }), 
+                        websocket
+                    )
+                    continue
+                
+                # A new question supersedes the answer still being generated
+                await cancel_generation(generation)
+                # The generation task inherits this correlation ID for all its log lines
+                new_request_id()
+                
                 # Send initial response to indicate processing
                 await manager.send_personal_message(
-                    json.dumps({
+                    dumps({
                         "type": "response_start",
                         "content": "🤔 Procesando tu mensaje..."
                     }), 
@@ -68,358 +246,449 @@ async def websocket_endpoint(websocket: WebSocket):
                 )
                 
                 # Process message with streaming
-                await process_chat_message_streaming(message_data["message"], websocket)
+                generation = asyncio.create_task(answer_chat(message_data["message"], WebSocketChannel(websocket), session))
+                
+            elif message_data["type"] == "cancel":
+                if await cancel_generation(generation):
+                    await manager.send_personal_message(
+                        dumps({
+                            "type": "response_end",
+                            "content": "⏹️ Generación cancelada"
+                        }), 
+                        websocket
+                    )
                 
             elif message_data["type"] == "github_connect":
-                response = await connect_github_repo(message_data["repo_url"])
+                new_request_id()
+                response = await connect_github_repo(message_data["repo_url"], session)
                 await manager.send_personal_message(
-                    json.dumps({
+                    dumps({
                         "type": "github_status",
                         "content": response
                     }), 
                     websocket
                 )
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any exit (client gone, bad frame, server error) releases the connection and its generation
         manager.disconnect(websocket)
+        # Abort the upstream Ollama stream as soon as the client goes away
+        await cancel_generation(generation)
 
-async def process_chat_message(message: str) -> str:
-    """Process chat message using Ollama with GitHub context"""
-    try:
-        # Check if Ollama is running
-        response = requests.get(f"{config.get_ollama_url('api/tags')}", timeout=5)
-        if response.status_code != 200:
-            return "❌ Error: Ollama no está ejecutándose. Por favor, inicia Ollama primero."
-        
-        # Get available models
-        models_response = requests.get(f"{config.get_ollama_url('api/tags')}")
-        if models_response.status_code == 200:
-            models = models_response.json().get("models", [])
-            if not models:
-                return "❌ Error: No hay modelos disponibles en Ollama. Por favor, descarga un modelo primero."
-            
-            # Use phi3 if available, otherwise first available model
-            phi3_model = None
-            for model in models:
-                if "phi3" in model["name"]:
-                    phi3_model = model["name"]
+@app.post("/api/chat")
+async def chat(chat_request: ChatRequest, request: Request):
+    """Answer a question over plain HTTP with the same pipeline as the WebSocket"""
+    session = await open_session(chat_request.session)
+    limited = await check_rate_limit(request, session.session_id)
+    if limited:
+        return limited
+    new_request_id()
+    channel = CollectingChannel()
+    await answer_chat(chat_request.message, channel, session)
+    if channel.error:
+        return JSONResponse({"error": channel.error, "session_id": session.session_id}, status_code=channel.status_code)
+    return {"response": channel.text, "session_id": session.session_id}
+
+@app.post("/api/chat/stream")
+async def chat_stream(chat_request: ChatRequest, request: Request):
+    """Stream the answer as Server-Sent Events, one event per WebSocket-protocol frame"""
+    session = await open_session(chat_request.session)
+    limited = await check_rate_limit(request, session.session_id)
+    if limited:
+        return limited
+    new_request_id()
+    channel = EventStreamChannel()
+
+    async def generate():
+        yield f"data: {dumps({'type': 'session', 'session_id': session.session_id, 'repo': session.repo_name})}\n\n"
+        generation = asyncio.create_task(answer_chat(chat_request.message, channel, session))
+        generation.add_done_callback(lambda _: channel.close())
+        try:
+            while True:
+                frame = await channel.frames.get()
+                if frame is None:
                     break
-            
-            if phi3_model:
-                model_name = phi3_model
-            else:
-                model_name = models[0]["name"]
-        else:
-            return "❌ Error: No se pudieron obtener los modelos de Ollama."
-        
-        # Check if user is asking about specific files or code
-        github_context = ""
-        keywords = [
-            "archivo", "file", "código", "code", "función", "function", 
-            "main.py", "config.py", "requirements.txt", "index.html",
-            "analiza", "analyze", "revisa", "review", "explica", "explain",
-            "qué hace", "what does", "cómo funciona", "how does", "error", "bug"
-        ]
-        
-        print(f"🔍 DEBUG: Mensaje del usuario: '{message}'")
-        print(f"🔍 DEBUG: Palabras clave detectadas: {[k for k in keywords if k in message.lower()]}")
-        
-        if any(keyword in message.lower() for keyword in keywords):
-            print("🔍 DEBUG: Palabras clave detectadas, obteniendo contexto de GitHub...")
-            github_context = await get_github_context(message)
-            print(f"🔍 DEBUG: Contexto obtenido: {'SÍ' if github_context else 'NO'}")
-        else:
-            print("🔍 DEBUG: No se detectaron palabras clave, usando chat normal")
-        
-        # Prepare prompt with GitHub context if available
-        if github_context:
-            prompt = f"{config.get_model_selection_prompt()}\n\nContexto del repositorio:\n{github_context}\n\nUsuario: {message}"
-            print(f"🔍 DEBUG: Prompt con contexto de GitHub, longitud: {len(prompt)} caracteres")
-        else:
-            prompt = f"{config.get_model_selection_prompt()}\n\nUsuario: {message}"
-            print(f"🔍 DEBUG: Prompt sin contexto, longitud: {len(prompt)} caracteres")
-        
-        # Send message to Ollama
-        ollama_data = {
-            "model": model_name,
-            "prompt": prompt,
-            "stream": False
-        }
-        
-        ollama_response = requests.post(
-            f"{config.get_ollama_url('api/generate')}",
-            json=ollama_data,
-            timeout=config.OLLAMA_TIMEOUT
+                yield f"data: {frame}\n\n"
+        finally:
+            # The client went away: stop the upstream Ollama stream too
+            await cancel_generation(generation)
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.post("/api/batch", status_code=202)
+async def create_batch(batch_request: BatchRequest, request: Request):
+    """Answer many questions in the background against one shared repository snapshot and index"""
+    new_request_id()
+    try:
+        items = parse_items(batch_request.questions) if batch_request.questions is not None else None
+        if items is not None and not items:
+            raise BatchError("El lote no tiene preguntas")
+        if items is not None and batch_request.job_id:
+            batch_manager.check_new(batch_request.job_id)
+        # Every question costs what a chat message costs; resuming pays only for the unanswered ones
+        cost = len(items) if items is not None else batch_manager.pending_count(batch_request.job_id or "")
+        if cost > rate_limiter.max_cost():
+            raise BatchError(f"El lote tiene {cost} preguntas y el límite ({config.RATE_LIMIT}) admite como máximo {int(rate_limiter.max_cost())}")
+        limited = await check_rate_limit(request, cost=max(cost, 1))
+        if limited:
+            return limited
+        repo = None
+        if batch_request.repo_url:
+            repo, error = await open_batch_repo(batch_request.repo_url)
+            if error:
+                return JSONResponse({"error": error}, status_code=400)
+        job = batch_manager.start(items, batch_answerer(repo), batch_concurrency(batch_request.concurrency), batch_request.job_id)
+    except BatchError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    logger.info("Lote %s iniciado: %d preguntas", job.job_id, len(job.items))
+    return job.stats()
+
+@app.get("/api/batch/{job_id}")
+async def batch_status(job_id: str):
+    """Progress of a batch started by this process"""
+    job = batch_manager.get(job_id)
+    if not job:
+        return JSONResponse({"error": "Lote no encontrado"}, status_code=404)
+    return job.stats()
+
+@app.get("/api/batch/{job_id}/results")
+async def batch_results(job_id: str):
+    """Answers written so far, one JSON object per line"""
+    output_path = batch_manager.output_path(job_id) if JOB_ID_PATTERN.match(job_id) else None
+    if not output_path or not os.path.exists(output_path):
+        return JSONResponse({"error": "Lote no encontrado"}, status_code=404)
+    return FileResponse(output_path, media_type="application/x-ndjson")
+
+async def open_batch_repo(repo_url: str) -> Tuple[Optional[RepoContext], Optional[str]]:
+    """Load a repository outside any session (a whole batch, or the warm-up); returns (context, error)"""
+    if not github_client:
+        return None, "❌ Error: Token de GitHub no configurado. Por favor, configura GITHUB_TOKEN en el archivo .env"
+    full_name = parse_repo_url(repo_url)
+    if not full_name:
+        return None, "❌ Error: URL de GitHub inválida"
+    repo_context = repo_contexts.get(full_name, github_client)
+    if not await repo_context.ready():
+        return None, f"❌ Error al conectar con GitHub: {repo_context.error}"
+    return repo_context, None
+
+def batch_answerer(repo: Optional[RepoContext]) -> AnswerFunction:
+    """Answer batch questions independently (no history), all sharing the same RepoContext"""
+    async def answer(question: str) -> Tuple[Optional[str], Optional[str]]:
+        session = ChatSession()
+        session.repo = repo
+        channel = CollectingChannel()
+        await answer_chat(question, channel, session)
+        if channel.error:
+            return None, channel.error
+        return channel.text, None
+    return answer
+
+async def check_rate_limit(request: Request, client_id: Optional[str] = None, cost: float = 1.0) -> Optional[JSONResponse]:
+    """Apply the per-client and per-IP limit to an HTTP request; returns the 429 response if exceeded"""
+    ip = client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    try:
+        await rate_limiter.acquire(client_id, ip, cost)
+    except RateLimitExceeded as e:
+        retry_after = math.ceil(e.retry_after)
+        return JSONResponse(
+            {"error": f"⏳ Has enviado demasiados mensajes. Inténtalo de nuevo en {retry_after} s.", "retry_after": retry_after},
+            status_code=429,
+            headers={"Retry-After": str(retry_after)}
         )
-        
-        if ollama_response.status_code == 200:
-            response_data = ollama_response.json()
-            return response_data.get("response", "No se pudo generar una respuesta.")
-        else:
-            return f"❌ Error al comunicarse con Ollama: {ollama_response.status_code}"
-            
-    except requests.exceptions.RequestException as e:
-        return f"❌ Error de conexión con Ollama: {str(e)}"
-    except Exception as e:
-        return f"❌ Error inesperado: {str(e)}"
+    return None
+
+async def open_session(session_id: Optional[str]) -> ChatSession:
+    """Resume a stored session by id, or start a new one"""
+    if not is_valid_session_id(session_id):
+        session_id = new_session_id()
+    session = ChatSession(session_id=session_id)
+    state = await session_store.load(session_id)
+    if state:
+        session.restore(state)
+    if session.repo_name and github_client:
+        # Shared with every session on this repository: loaded once per process, not per request
+        session.repo = repo_contexts.get(session.repo_name, github_client)
+    return session
 
-async def get_github_context(message: str) -> str:
-    """Get relevant GitHub context based on user message"""
+async def save_session(session: Optional[ChatSession]):
+    """Persist the session state so other connections and workers see it"""
+    if session and session.session_id:
+        await session_store.save(session.session_id, session.to_state())
+
+async def cancel_generation(task: Optional[asyncio.Task]) -> bool:
+    """Cancel a running generation task and wait until it has released its resources"""
+    if task is None or task.done():
+        return False
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return True
+
+def build_prompt(model_name: str, message: str, github_context: List[str], session: Optional[ChatSession] = None) -> BuiltPrompt:
+    """Assemble the chat messages, truncating context and history in priority order to fit the model budget"""
+    builder = PromptBuilder(config.get_prompt_budget(model_name))
+    builder.add("system", config.get_model_selection_prompt(), required=True, role="system")
+    if session:
+        # Older turns are the first to go when the budget is tight
+        turns = session.turns()
+        for position, turn in enumerate(turns):
+            builder.add(f"history:{position}", turn["content"], priority=100 + len(turns) - position, role=turn["role"])
+    if github_context:
+        header, *blocks = github_context
+        builder.add("context", f"Contexto del repositorio:\n{header}", priority=1)
+        # Blocks arrive ordered by relevance: mentioned files first, then ranked chunks
+        for position, block in enumerate(blocks):
+            name = block.split("\n", 1)[0].strip("- ")
+            builder.add(name, block.strip(), priority=2 + position)
+    builder.add("user", message, required=True)
+    built_prompt = builder.build()
+    PROMPT_TOKENS.observe(built_prompt.total_tokens)
+    return built_prompt
+
+def response_cache_key(model_name: str, message: str, built_prompt: BuiltPrompt) -> str:
+    """Cache key over everything the answer depends on besides the (normalized) question"""
+    context = "\n".join(f"{section.role}:{section.text}" for section in built_prompt.sections if section.name != "user")
+    return response_cache.make_key(model_name, message, context, config.get_model_options(model_name))
+
+async def get_github_context(message: str, session: Optional[ChatSession] = None,
+                             intents: Optional[MessageIntents] = None) -> List[str]:
+    """Get relevant GitHub context blocks based on user message (header first)"""
     try:
-        print(f"🔍 DEBUG: get_github_context llamado con mensaje: {message}")
-        
         if not github_client:
-            print("❌ DEBUG: No hay github_client")
-            return ""
-        
-        # Try to get the connected repository
-        global active_repo
-        print(f"🔍 DEBUG: active_repo actual: {active_repo}")
-        
-        if not active_repo:
-            print("🔍 DEBUG: No hay active_repo, intentando obtener el primero...")
-            try:
-                # Get the first repository from the user's account
-                user = github_client.get_user()
-                repos = user.get_repos()
-                if not repos:
-                    print("❌ DEBUG: No se encontraron repositorios")
-                    return ""
-                
-                # Use the first repository (usually the main one)
-                active_repo = repos[0]
-                print(f"✅ DEBUG: Repositorio activo establecido: {active_repo.name}")
-            except Exception as e:
-                print(f"❌ DEBUG: Error obteniendo repositorio: {str(e)}")
-                return ""
-        
-        repo = active_repo
-        print(f"🔍 DEBUG: Usando repositorio: {repo.name}")
-        
-        # Extract file names from the message
+            return []
+        
+        # Use the repository connected in this session, loaded when it was connected
+        repo_context = session.repo if session else None
+        if not repo_context:
+            logger.debug("No hay repositorio conectado en esta sesión")
+            return []
+        if not await repo_context.ready():
+            logger.warning("Repositorio %s no disponible: %s", repo_context.full_name, repo_context.error)
+            return []
+        
+        repo = repo_context.repo
+        snapshot = repo_context.snapshot
+        index = repo_context.index
+        
+        # File names mentioned in the message
         files_to_read = []
-        message_lower = message.lower()
+        intents = intents or intent_matcher.classify(message)
         
-        # Check for specific file mentions
-        if "main.py" in message_lower:
-            files_to_read.append("main.py")
-        if "config.py" in message_lower:
-            files_to_read.append("config.py")
-        if "requirements.txt" in message_lower:
-            files_to_read.append("requirements.txt")
-        if "index.html" in message_lower:
-            files_to_read.append("templates/index.html")
-        
-        # If no specific files mentioned, read main.py by default
-        if not files_to_read:
+        if snapshot:
+            # Resolve any mentioned path against the local snapshot index
+            files_to_read = snapshot.resolve_paths(intents.files)
+        else:
+            # Only the well-known files can be fetched without a snapshot to search
+            for mention in intents.files:
+                path = KNOWN_FILES.get(mention.rsplit("/", 1)[-1])
+                if path and path not in files_to_read:
+                    files_to_read.append(path)
+        
+        # If no specific files mentioned, read main.py by default (the index picks chunks instead)
+        if not files_to_read and not index and (not snapshot or "main.py" in snapshot):
             files_to_read.append("main.py")
         
         # Read file contents
-        context = f"Repositorio: {repo.name}\n"
-        context += f"Archivos relevantes:\n\n"
+        context = [f"Repositorio: {repo.name}\nArchivos relevantes:"]
         
-        print(f"🔍 DEBUG: Intentando leer archivos: {files_to_read}")
+        logger.debug("Archivos a leer: %s", files_to_read)
         
+        remaining_budget = config.RETRIEVAL_TOKEN_BUDGET
         for file_path in files_to_read:
             try:
-                print(f"🔍 DEBUG: Leyendo archivo: {file_path}")
-                contents = repo.get_contents(file_path)
-                if contents.type == "file":
-                    # Decode content (GitHub returns base64)
-                    import base64
-                    file_content = base64.b64decode(contents.content).decode('utf-8')
-                    print(f"✅ DEBUG: Archivo {file_path} leído exitosamente, tamaño: {len(file_content)} caracteres")
-                    context += f"--- {file_path} ---\n{file_content}\n\n"
+                if snapshot and file_path in snapshot:
+                    # Served from the local snapshot, no GitHub API call
+                    try:
+                        file_content = await asyncio.to_thread(snapshot.read, file_path)
+                    except FileNotFoundError:
+                        # Another worker pruned this commit: fetch the same version from GitHub
+                        logger.info("Instantánea %s de %s ya no está en disco", snapshot.sha[:7], repo.full_name)
+                        file_content = await asyncio.to_thread(github_cache.get_file, repo, file_path, snapshot.sha)
                 else:
-                    print(f"❌ DEBUG: {file_path} no es un archivo, es: {contents.type}")
+                    # Cached and revalidated with a conditional request (304s are free)
+                    file_content = await asyncio.to_thread(github_cache.get_file, repo, file_path)
+                if file_content is not None:
+                    logger.debug("Archivo %s leído (%d caracteres)", file_path, len(file_content))
+                    file_tokens = estimate_tokens(file_content)
+                    if index and file_tokens > remaining_budget:
+                        # Too large for the prompt: keep only the chunks relevant to the question
+                        chunks = index.select(message, config.RETRIEVAL_TOP_K, remaining_budget, paths=[file_path])
+                        for chunk in chunks:
+                            context.append(chunk.format())
+                            remaining_budget -= estimate_tokens(chunk.text)
+                    else:
+                        context.append(f"--- {file_path} ---\n{file_content}\n\n")
+                        remaining_budget -= file_tokens
+                else:
+                    logger.debug("%s no es un archivo", file_path)
             except Exception as e:
-                print(f"❌ DEBUG: Error leyendo {file_path}: {str(e)}")
-                context += f"--- {file_path} ---\nNo se pudo leer el archivo: {str(e)}\n\n"
-        
-        print(f"🔍 DEBUG: Contexto generado, longitud: {len(context)} caracteres")
+                logger.warning("Error leyendo %s: %s", file_path, e)
+                context.append(f"--- {file_path} ---\nNo se pudo leer el archivo: {str(e)}\n\n")
+        
+        if index and not files_to_read:
+            # No file mentioned: pick the most relevant chunks across the repository
+            chunks = []
+            if config.RETRIEVAL_MODE == "semantic" and semantic_store.get(repo.full_name):
+                try:
+                    chunks = await semantic_store.select(repo.full_name, message, config.RETRIEVAL_TOP_K, config.RETRIEVAL_TOKEN_BUDGET)
+                except (OllamaError, httpx.HTTPError) as e:
+                    logger.warning("Búsqueda semántica no disponible, usando BM25: %s", e)
+            if not chunks:
+                chunks = index.select(message, config.RETRIEVAL_TOP_K, config.RETRIEVAL_TOKEN_BUDGET)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Fragmentos seleccionados: %s", [(c.path, c.start_line) for c in chunks])
+            for chunk in chunks:
+                context.append(chunk.format())
+        
+        logger.debug("Contexto generado: %d bloques", len(context) - 1)
         return context
         
     except Exception as e:
-        return f"Error obteniendo contexto de GitHub: {str(e)}"
+        return [f"Error obteniendo contexto de GitHub: {str(e)}"]
 
-async def process_chat_message_streaming(message: str, websocket: WebSocket):
-    """Process chat message using Ollama with streaming and GitHub context"""
+async def answer_chat(message: str, channel: "ChatChannel", session: Optional[ChatSession] = None):
+    """Answer one chat message through the shared pipeline, delivering the output to `channel`"""
+    started = time.perf_counter()
     try:
-        # Check if Ollama is running
-        response = requests.get(f"{config.get_ollama_url('api/tags')}", timeout=5)
-        if response.status_code != 200:
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "response_end",
-                    "content": "❌ Error: Ollama no está ejecutándose. Por favor, inicia Ollama primero."
-                }), 
-                websocket
-            )
+        # Resolve the model from the cached registry
+        try:
+            model_name = await model_registry.resolve()
+        except OllamaError:
+            await channel.end("❌ Error: Ollama no está ejecutándose. Por favor, inicia Ollama primero.", 503)
             return
-        
-        # Get available models
-        models_response = requests.get(f"{config.get_ollama_url('api/tags')}")
-        if models_response.status_code == 200:
-            models = models_response.json().get("models", [])
-            if not models:
-                await manager.send_personal_message(
-                    json.dumps({
-                        "type": "response_end",
-                        "content": "❌ Error: No hay modelos disponibles en Ollama. Por favor, descarga un modelo primero."
-                    }), 
-                    websocket
-                )
-                return
-            
-            # Use phi3:mini if available, otherwise first available model
-            phi3_mini_model = None
-            for model in models:
-                if "phi3:mini" in model["name"]:
-                    phi3_mini_model = model["name"]
-                    break
-            
-            if phi3_mini_model:
-                model_name = phi3_mini_model
-            else:
-                model_name = models[0]["name"]
-        else:
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "response_end",
-                    "content": "❌ Error: No se pudieron obtener los modelos de Ollama."
-                }), 
-                websocket
-            )
+        except ModelNotAvailableError as e:
+            await channel.end(f"❌ Error: {str(e)}", 503)
             return
         
-        # Check if user is asking about specific files or code
-        github_context = ""
-        keywords = [
-            "archivo", "file", "código", "code", "función", "function", 
-            "main.py", "config.py", "requirements.txt", "index.html",
-            "analiza", "analyze", "revisa", "review", "explica", "explain",
-            "qué hace", "what does", "cómo funciona", "how does", "error", "bug"
-        ]
-        
-        print(f"🔍 DEBUG: Mensaje del usuario: '{message}'")
-        print(f"🔍 DEBUG: Palabras clave detectadas: {[k for k in keywords if k in message.lower()]}")
-        
-        if any(keyword in message.lower() for keyword in keywords):
-            print("🔍 DEBUG: Palabras clave detectadas, obteniendo contexto de GitHub...")
-            github_context = await get_github_context(message)
-            print(f"🔍 DEBUG: Contexto obtenido: {'SÍ' if github_context else 'NO'}")
-        else:
-            print("🔍 DEBUG: No se detectaron palabras clave, usando chat normal")
-        
-        # Prepare prompt with GitHub context if available
-        if github_context:
-            prompt = f"{config.get_model_selection_prompt()}\n\nContexto del repositorio:\n{github_context}\n\nUsuario: {message}"
-            print(f"🔍 DEBUG: Prompt con contexto de GitHub, longitud: {len(prompt)} caracteres")
-        else:
-            prompt = f"{config.get_model_selection_prompt()}\n\nUsuario: {message}"
-            print(f"🔍 DEBUG: Prompt sin contexto, longitud: {len(prompt)} caracteres")
-        
-        # Send message to Ollama with streaming
-        ollama_data = {
-            "model": model_name,
-            "prompt": prompt,
-            "stream": True
-        }
-        
-        print(f"🚀 Enviando a Ollama con modelo: {model_name}")
-        
-        # Stream response from Ollama
-        ollama_response = requests.post(
-            f"{config.get_ollama_url('api/generate')}",
-            json=ollama_data,
-            timeout=config.OLLAMA_TIMEOUT,
-            stream=True
-        )
+        # Check if user is asking about specific files or code (one pass of a precompiled matcher)
+        github_context = []
+        intents = intent_matcher.classify(message)
+        
+        logger.debug("Mensaje recibido (%d caracteres), palabras clave: %s", len(message), intents.keywords)
+        
+        # Naming a path ("muéstrame src/app/router.ts") is a code question even without a keyword
+        if "code" in intents.intents or intents.files:
+            with GITHUB_CONTEXT_SECONDS.time():
+                github_context = await get_github_context(message, session, intents)
+            logger.debug("Contexto del repositorio: %d bloques", len(github_context))
+        
+        # Prepare prompt within the model's token budget
+        built_prompt = build_prompt(model_name, message, github_context, session)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Prompt: %s", built_prompt.describe())
+        
+        # A cached answer is replayed through the same response_chunk protocol
+        cache_key = response_cache_key(model_name, message, built_prompt)
+        cached_response = await response_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info("Respuesta servida desde la caché")
+            for chunk in response_cache.replay_chunks(cached_response):
+                await channel.chunk(chunk)
+            await channel.end()
+            if session:
+                session.record(message, cached_response)
+                await save_session(session)
+            return
         
-        if ollama_response.status_code == 200:
-            full_response = ""
-            for line in ollama_response.iter_lines():
-                if line:
-                    try:
-                        data = json.loads(line.decode('utf-8'))
-                        if 'response' in data:
-                            chunk = data['response']
-                            full_response += chunk
-                            
-                            # Send chunk to frontend
-                            await manager.send_personal_message(
-                                json.dumps({
-                                    "type": "response_chunk",
-                                    "content": chunk
-                                }), 
-                                websocket
-                            )
-                            
-                        if data.get('done', False):
-                            break
-                            
-                    except json.JSONDecodeError:
-                        continue
-            
-            # Send end marker
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "response_end",
-                    "content": ""
-                }), 
-                websocket
-            )
-            
-            print(f"✅ Respuesta completa enviada, longitud: {len(full_response)} caracteres")
-            
-        else:
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "response_end",
-                    "content": f"❌ Error al comunicarse con Ollama: {ollama_response.status_code}"
-                }), 
-                websocket
-            )
+        logger.debug("Enviando a Ollama con modelo %s", model_name)
+        
+        # Stream response from Ollama; identical in-flight questions share one upstream stream
+        response_parts: List[str] = []
+        messages = built_prompt.messages()
+        notify = queue_position_notifier(channel)
+        # Tokens are grouped into short time/size windows: one frame per batch instead of per token
+        batches = batch_chunks(single_flight.stream(cache_key, lambda: stream_answer(model_name, messages, notify)))
+        try:
+            async for batch in batches:
+                if not response_parts:
+                    TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                response_parts.append(batch)
+                
+                # Send chunk to the client
+                await channel.chunk(batch)
+        finally:
+            # Unsubscribe right away (even when cancelled mid-send) so an abandoned upstream stream stops
+            await batches.aclose()
+        full_response = "".join(response_parts)
+        
+        # Send end marker
+        await channel.end()
+        
+        if session:
+            session.record(message, full_response)
+            await save_session(session)
+        await response_cache.set(cache_key, full_response)
+        GENERATION_SECONDS.observe(time.perf_counter() - started)
+        RESPONSES_TOTAL.inc()
+        
+        logger.info("Respuesta completa: %d caracteres en %.2f s", len(full_response), time.perf_counter() - started)
             
-    except requests.exceptions.RequestException as e:
-        await manager.send_personal_message(
-            json.dumps({
-                "type": "response_end",
-                "content": f"❌ Error de conexión con Ollama: {str(e)}"
-            }), 
-            websocket
-        )
+    except QueueFullError as e:
+        await channel.end(f"⏳ El servidor está ocupado ({e.queued} solicitudes en cola). Inténtalo de nuevo en unos segundos.", 503)
+    except OllamaError as e:
+        model_registry.invalidate_if_missing(e)
+        await channel.end(f"❌ Error al comunicarse con Ollama: {e.status_code}", 502)
+    except httpx.HTTPError as e:
+        await channel.end(f"❌ Error de conexión con Ollama: {str(e)}", 502)
     except Exception as e:
-        await manager.send_personal_message(
-            json.dumps({
-                "type": "response_end",
-                "content": f"❌ Error inesperado: {str(e)}"
-            }), 
-            websocket
-        )
+        await channel.end(f"❌ Error inesperado: {str(e)}", 500)
+
+async def stream_answer(model_name: str, messages: List[dict], on_position: Optional[PositionCallback] = None):
+    """Yield the answer text chunks streamed by Ollama once the scheduler admits the generation"""
+    async with generation_scheduler.slot(on_position):
+        async for data in ollama_client.stream_chat(model_name, messages, options=config.get_model_options(model_name)):
+            chunk = data.get('message', {}).get('content')
+            if chunk:
+                yield chunk
+            if data.get('done') and data.get('eval_duration'):
+                TOKENS_PER_SECOND.observe(data.get('eval_count', 0) / (data['eval_duration'] / 1e9))
 
-async def connect_github_repo(repo_url: str) -> str:
+def queue_position_notifier(channel: "ChatChannel") -> PositionCallback:
+    """Report the queue position to a client; a closed connection must not abort the shared generation"""
+    async def notify(position: int):
+        try:
+            await channel.queue_position(position)
+        except Exception:
+            pass
+    return notify
+
+def parse_repo_url(repo_url: str) -> Optional[str]:
+    """"owner/name" from a GitHub repository URL, or None if it is not one"""
+    if "github.com" not in repo_url:
+        return None
+    parts = repo_url.split("github.com/")[-1].split("/")
+    if len(parts) < 2:
+        return None
+    return f"{parts[0]}/{parts[1].replace('.git', '')}"
+
+async def connect_github_repo(repo_url: str, session: Optional[ChatSession] = None) -> str:
     """Connect to GitHub repository and analyze code"""
     try:
         if not github_client:
             return "❌ Error: Token de GitHub no configurado. Por favor, configura GITHUB_TOKEN en el archivo .env"
         
         # Extract username and repository from URL
-        if "github.com" in repo_url:
-            parts = repo_url.split("github.com/")[-1].split("/")
-            if len(parts) >= 2:
-                username = parts[0]
-                repo_name = parts[1].replace(".git", "")
-            else:
-                return "❌ Error: URL de GitHub inválida"
-        else:
+        full_name = parse_repo_url(repo_url)
+        if not full_name:
             return "❌ Error: URL de GitHub inválida"
         
-        # Get repository
-        repo = github_client.get_repo(f"{username}/{repo_name}")
+        # Get repository and download the whole repository once so later questions resolve locally
+        repo_context = repo_contexts.get(full_name, github_client)
+        if not await repo_context.ready():
+            return f"❌ Error al conectar con GitHub: {repo_context.error}"
+        repo = repo_context.repo
         
-        # Store active repository globally
-        global active_repo
-        active_repo = repo
+        # The session remembers its repository; the loaded context is shared per process
+        if session:
+            session.repo = repo_context
+            session.repo_name = repo.full_name
+            await save_session(session)
         
         # Get repository information
         repo_info = {
@@ -433,15 +702,24 @@ async def connect_github_repo(repo_url: str) -> str:
         }
         
         # Get main files
-        contents = repo.get_contents("")
+        snapshot = repo_context.snapshot
         files = []
-        for content in contents[:10]:  # Limit to first 10 files
-            if content.type == "file":
+        if snapshot:
+            for path in snapshot.root_files()[:20]:  # Limit the listing, not the index
                 files.append({
-                    "name": content.name,
-                    "path": content.path,
-                    "size": content.size
+                    "name": path,
+                    "path": path,
+                    "size": snapshot.files[path]
                 })
+        else:
+            contents = await asyncio.to_thread(github_cache.get_listing, repo)
+            for content in contents[:10]:  # Limit to first 10 files
+                if content["type"] == "file":
+                    files.append({
+                        "name": content["name"],
+                        "path": content["path"],
+                        "size": content["size"]
+                    })
         
         response = f"✅ Conectado exitosamente al repositorio: {repo.name}\n\n"
         response += f"📊 Información del repositorio:\n"
@@ -449,7 +727,10 @@ async def connect_github_repo(repo_url: str) -> str:
         response += f"• Lenguaje principal: {repo_info['language']}\n"
         response += f"• Estrellas: {repo_info['stars']}\n"
         response += f"• Forks: {repo_info['forks']}\n"
-        response += f"• Rama principal: {repo_info['default_branch']}\n\n"
+        response += f"• Rama principal: {repo_info['default_branch']}\n"
+        if snapshot:
+            response += f"• Archivos indexados: {len(snapshot.files)}\n"
+        response += "\n"
         response += f"📁 Archivos principales:\n"
         for file in files:
             response += f"• {file['name']} ({file['size']} bytes)\n"
@@ -464,7 +745,16 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Check Ollama
-        ollama_status = "✅ Conectado" if requests.get(f"{config.get_ollama_url('api/tags')}", timeout=5).status_code == 200 else "❌ Desconectado"
+        model_name = None
+        try:
+            # Wait for the refresh when the cached list expired: chat answers from the stale list, health must not
+            await model_registry.refresh()
+            model_name = await model_registry.resolve()
+            ollama_status = "✅ Conectado" if ollama_client.is_available() else "❌ Desconectado"
+        except (OllamaError, httpx.HTTPError):
+            ollama_status = "❌ Desconectado"
+        except ModelNotAvailableError:
+            ollama_status = "✅ Conectado"
         
         # Check GitHub
         github_status = "✅ Conectado" if config.is_github_enabled() else "❌ No configurado"
@@ -472,7 +762,18 @@ async def health_check():
         return {
             "status": "healthy",
             "ollama": ollama_status,
+            "model": model_name,
             "github": github_status,
+            "ollama_backends": ollama_client.stats(),
+            "models": model_registry.stats(),
+            "github_cache": github_cache.stats(),
+            "response_cache": response_cache.stats(),
+            "single_flight": single_flight.stats(),
+            "scheduler": generation_scheduler.stats(),
+            "sessions": session_store.stats(),
+            "rate_limit": rate_limiter.stats(),
+            "repo_contexts": repo_contexts.stats(),
+            "warmup": warmup.stats(),
             "timestamp": "2024-01-01T00:00:00Z"
         }
     except Exception as e:
@@ -481,6 +782,78 @@ async def health_check():
             "error": str(e)
         }
 
+@app.get("/api/live")
+async def liveness():
+    """Liveness: the process is up and serving requests (says nothing about Ollama)"""
+    return {"status": "alive"}
+
+def is_ready() -> bool:
+    return warmup.ready and ollama_client.is_available()
+
+@app.get("/api/ready")
+async def readiness():
+    """Readiness: 200 once the warm-up finished and some Ollama server is healthy, 503 until then"""
+    ready = is_ready()
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "ollama_available": ollama_client.is_available(),
+        **warmup.stats(),
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def check_config() -> str:
+    errors = config.validate()
+    if errors:
+        raise ValueError("; ".join(errors))
+    return "configuración válida"
+
+async def warm_model() -> str:
+    """Load the selected model on every Ollama server so the first question skips the load"""
+    model_name = await model_registry.resolve()
+    results = await ollama_client.preload(model_name)
+    loaded = [url for url, error in results.items() if error is None]
+    if not loaded:
+        raise RuntimeError(f"No se pudo cargar {model_name}: {'; '.join(results.values())}")
+    return f"{model_name} cargado en {len(loaded)}/{len(results)} servidores (keep_alive={config.get_keep_alive()})"
+
+async def warm_repo() -> str:
+    repo, error = await open_batch_repo(config.WARMUP_REPO)
+    if error:
+        raise RuntimeError(error)
+    snapshot = repo.snapshot
+    return f"{repo.full_name}: {len(snapshot.files) if snapshot else 0} archivos indexados"
+
+def warmup_steps() -> List[WarmupStep]:
+    """Warm-up steps from the configuration; only config and model gate readiness"""
+    steps = [WarmupStep("config", check_config, retry=False)]
+    if config.WARMUP_ENABLED:
+        steps.append(WarmupStep("model", warm_model))
+    if config.WARMUP_REPO:
+        # GitHub being down must not take the instance out of rotation
+        steps.append(WarmupStep("repo", warm_repo, required=False))
+    return steps
+
+async def startup():
+    """Start logging and load persisted caches on startup"""
+    configure_logging()
+    await asyncio.to_thread(github_cache.load)
+    if config.RETRIEVAL_MODE == "semantic":
+        await asyncio.to_thread(semantic_store.load_all)
+
+async def shutdown():
+    """Close pooled connections and persist caches on shutdown"""
+    await warmup.aclose()
+    # Interrupted batches resume later from their output files
+    await batch_manager.aclose()
+    await ollama_client.aclose()
+    await asyncio.to_thread(github_cache.save)
+    shutdown_logging()
+
 if __name__ == "__main__":
     # Validate configuration
     errors = config.validate()
@@ -0,0 +1,176 @@
+"""
+Métricas en formato de texto de Prometheus (sin dependencias externas)
+"""
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Buckets por defecto, en segundos
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SEND_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Metric:
+    """Base de las métricas: nombre, ayuda y tipo"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Contador monótono"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def samples(self):
+        return [(self.name, {}, self.value)]
+
+
+class FunctionMetric(Metric):
+    """Valor leído en cada scrape: no cuesta nada en el camino de las peticiones"""
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, documentation)
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, {}, float(self.function()))]
+
+
+class Histogram(Metric):
+    """Histograma con buckets fijos; observar es una búsqueda binaria y dos sumas"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        # bisect_left: un valor igual al límite cae en ese bucket (le)
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> "_Timer":
+        """Medir la duración de un bloque `with`"""
+        return _Timer(self)
+
+    def samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", {"le": _format_value(bound)}, cumulative))
+        samples.append((f"{self.name}_sum", {}, self.sum))
+        samples.append((f"{self.name}_count", {}, cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """Conjunto de métricas expuestas en /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], float]) -> Metric:
+        return self.register(FunctionMetric(name, documentation, function, "gauge"))
+
+    def counter_function(self, name: str, documentation: str, function: Callable[[], float]) -> Metric:
+        return self.register(FunctionMetric(name, documentation, function, "counter"))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registro global y métricas de la aplicación
+registry = Registry()
+
+MODEL_DISCOVERY_SECONDS = registry.histogram(
+    "chatbot_model_discovery_seconds", "Tiempo de consulta de modelos a Ollama (/api/tags)")
+GITHUB_CONTEXT_SECONDS = registry.histogram(
+    "chatbot_github_context_seconds", "Tiempo para obtener el contexto del repositorio")
+PROMPT_TOKENS = registry.histogram(
+    "chatbot_prompt_tokens", "Tamaño estimado del prompt en tokens", TOKEN_BUCKETS)
+TIME_TO_FIRST_TOKEN_SECONDS = registry.histogram(
+    "chatbot_time_to_first_token_seconds", "Tiempo desde la pregunta hasta el primer trozo enviado")
+TOKENS_PER_SECOND = registry.histogram(
+    "chatbot_tokens_per_second", "Velocidad de generación informada por Ollama", RATE_BUCKETS)
+GENERATION_SECONDS = registry.histogram(
+    "chatbot_generation_seconds", "Duración total de una respuesta")
+WEBSOCKET_SEND_SECONDS = registry.histogram(
+    "chatbot_websocket_send_seconds", "Duración de cada envío por WebSocket", SEND_BUCKETS)
+RESPONSES_TOTAL = registry.counter(
+    "chatbot_responses_total", "Respuestas completas enviadas")
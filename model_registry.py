@@ -0,0 +1,129 @@
+"""
+Registro de modelos de Ollama con caché TTL y refresco en segundo plano
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from config import config
+from metrics import MODEL_DISCOVERY_SECONDS
+from ollama_client import OllamaClient, OllamaError, ollama_client
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotAvailableError(Exception):
+    """No hay ningún modelo utilizable en Ollama"""
+
+
+class ModelRegistry:
+    """Cachea /api/tags y resuelve OLLAMA_DEFAULT_MODEL una sola vez"""
+
+    # Preferencias cuando OLLAMA_DEFAULT_MODEL es "auto"
+    PREFERRED_MODELS = ("phi3:mini", "phi3")
+
+    def __init__(self, client: OllamaClient, ttl: float):
+        self.client = client
+        self.ttl = ttl
+        self._models: Optional[List[Dict[str, Any]]] = None
+        self._selected: Optional[str] = None
+        self._fetched_at = 0.0
+        # Error del último refresco (None si fue bien): la lista cacheada puede estar obsoleta
+        self.last_error: Optional[str] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _is_fresh(self) -> bool:
+        return self._models is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def refresh(self) -> List[Dict[str, Any]]:
+        """Consultar /api/tags y actualizar la caché"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Otra corrutina pudo haber refrescado mientras esperábamos
+            if self._is_fresh():
+                return self._models
+            try:
+                with MODEL_DISCOVERY_SECONDS.time():
+                    models = await self.client.list_models()
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+                raise
+            self.last_error = None
+            self._models = models
+            self._selected = None
+            self._fetched_at = time.monotonic()
+            return models
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning("No se pudo refrescar la lista de modelos de Ollama: %s", e)
+
+    async def get_models(self) -> List[Dict[str, Any]]:
+        """Obtener la lista de modelos, refrescándola en segundo plano si caducó"""
+        if self._is_fresh():
+            return self._models
+
+        if self._models is None:
+            return await self.refresh()
+
+        # Devolver la lista anterior mientras se refresca sin bloquear la petición
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+        return self._models
+
+    async def resolve(self) -> str:
+        """Resolver el modelo a usar según OLLAMA_DEFAULT_MODEL"""
+        models = await self.get_models()
+        if self._selected is None:
+            self._selected = self._select(models)
+        return self._selected
+
+    def _select(self, models: List[Dict[str, Any]]) -> str:
+        if not models:
+            raise ModelNotAvailableError("No hay modelos disponibles en Ollama. Por favor, descarga un modelo primero.")
+
+        names = [model["name"] for model in models]
+        requested = config.OLLAMA_DEFAULT_MODEL.strip()
+
+        if requested and requested.lower() != "auto":
+            for name in names:
+                if name == requested or name.split(":")[0] == requested:
+                    return name
+            raise ModelNotAvailableError(f"El modelo '{requested}' no está disponible en Ollama. Ejecuta: ollama pull {requested}")
+
+        for preferred in self.PREFERRED_MODELS:
+            for name in names:
+                if preferred in name:
+                    return name
+        return names[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la caché de modelos"""
+        return {
+            "models": len(self._models) if self._models is not None else None,
+            "age": round(time.monotonic() - self._fetched_at, 1) if self._models is not None else None,
+            "selected": self._selected,
+            "last_error": self.last_error,
+        }
+
+    def invalidate(self):
+        """Descartar la caché para forzar una nueva consulta"""
+        self._models = None
+        self._selected = None
+        self._fetched_at = 0.0
+
+    def invalidate_if_missing(self, error: OllamaError) -> bool:
+        """Invalidar la caché si Ollama indica que el modelo no existe"""
+        if error.status_code == 404 or "not found" in error.detail.lower():
+            self.invalidate()
+            return True
+        return False
+
+
+# Instancia global del registro de modelos
+model_registry = ModelRegistry(ollama_client, config.OLLAMA_MODELS_TTL)
@@ -0,0 +1,380 @@
+"""
+Cliente asíncrono para la API de Ollama, con balanceo entre varios servidores
+"""
+import asyncio
+import contextvars
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from config import config
+from serialization import iter_ndjson
+
+
+class OllamaError(Exception):
+    """Error HTTP devuelto por Ollama"""
+
+    def __init__(self, status_code: int, detail: str = ""):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(detail or f"HTTP {status_code}")
+
+
+def with_keep_alive(payload: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Añadir OLLAMA_KEEP_ALIVE para que el modelo siga cargado entre preguntas (las opciones lo pueden cambiar)"""
+    keep_alive = config.get_keep_alive()
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    payload.update(options)
+    return payload
+
+
+class OllamaClient:
+    """Cliente de Ollama con un pool de conexiones keep-alive compartido"""
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = (base_url or config.OLLAMA_BASE_URL).rstrip("/")
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Obtener (o crear) el cliente HTTP compartido"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(config.OLLAMA_TIMEOUT, connect=config.OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=config.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.OLLAMA_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    async def list_models(self) -> List[Dict[str, Any]]:
+        """Listar los modelos disponibles (/api/tags)"""
+        response = await self.client.get("/api/tags", timeout=config.OLLAMA_CONNECT_TIMEOUT)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json().get("models", [])
+
+    async def list_running(self) -> List[Dict[str, Any]]:
+        """Listar los modelos cargados en memoria (/api/ps)"""
+        response = await self.client.get("/api/ps", timeout=config.OLLAMA_CONNECT_TIMEOUT)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json().get("models", [])
+
+    async def generate(self, model: str, prompt: str, **options: Any) -> Dict[str, Any]:
+        """Generar una respuesta completa sin streaming"""
+        payload = with_keep_alive({"model": model, "prompt": prompt, "stream": False}, options)
+        response = await self.client.post("/api/generate", json=payload)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json()
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], **options: Any) -> Dict[str, Any]:
+        """Responder a una conversación sin streaming (/api/chat)"""
+        payload = with_keep_alive({"model": model, "messages": messages, "stream": False}, options)
+        response = await self.client.post("/api/chat", json=payload)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json()
+
+    def stream_generate(self, model: str, prompt: str, **options: Any) -> AsyncIterator[Dict[str, Any]]:
+        """Generar una respuesta en streaming (/api/generate)"""
+        return self._stream("/api/generate", with_keep_alive({"model": model, "prompt": prompt, "stream": True}, options))
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], **options: Any) -> AsyncIterator[Dict[str, Any]]:
+        """Responder a una conversación en streaming (/api/chat)"""
+        return self._stream("/api/chat", with_keep_alive({"model": model, "messages": messages, "stream": True}, options))
+
+    async def _stream(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Devolver cada línea NDJSON de una respuesta en streaming ya decodificada"""
+        async with self.client.stream("POST", path, json=payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise OllamaError(response.status_code, response.text)
+
+            # Las líneas se decodifican desde bytes, sin pasar antes por str
+            async for data in iter_ndjson(response.aiter_bytes()):
+                yield data
+
+                if data.get("done", False):
+                    break
+
+    async def load(self, model: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Cargar el modelo en memoria sin generar nada (/api/generate sin prompt)"""
+        payload = with_keep_alive({"model": model, "stream": False}, {})
+        response = await self.client.post("/api/generate", json=payload, timeout=timeout or config.WARMUP_TIMEOUT)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json()
+
+    async def embed(self, model: str, inputs: List[str]) -> List[List[float]]:
+        """Obtener embeddings para un lote de textos (/api/embed)"""
+        response = await self.client.post("/api/embed", json=with_keep_alive({"model": model, "input": inputs}, {}))
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json()["embeddings"]
+
+    async def aclose(self):
+        """Cerrar el pool de conexiones"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Errores que justifican reintentar en otro servidor"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, OllamaError):
+        return error.status_code >= 500 or error.status_code == 404 or "not found" in error.detail.lower()
+    return False
+
+
+def counts_as_failure(error: Exception) -> bool:
+    """Errores que indican que el servidor (no la petición) falla"""
+    return isinstance(error, httpx.TransportError) or (isinstance(error, OllamaError) and error.status_code >= 500)
+
+
+class OllamaBackend:
+    """Un servidor de Ollama con su estado de salud"""
+
+    def __init__(self, base_url: str):
+        self.client = OllamaClient(base_url)
+        self.base_url = self.client.base_url
+        self.healthy = True
+        self.failures = 0
+        self.outstanding = 0
+        self.requests = 0
+        self.latency: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # Modelos cargados en memoria (/api/ps) y disponibles (/api/tags)
+        self.loaded: Set[str] = set()
+        self.available: Set[str] = set()
+
+    def mark_success(self):
+        self.failures = 0
+        self.healthy = True
+
+    def mark_failure(self, error: Exception, max_failures: int):
+        self.failures += 1
+        self.last_error = str(error) or error.__class__.__name__
+        if self.failures >= max_failures:
+            self.healthy = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "loaded_models": sorted(self.loaded),
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """Reparte las peticiones entre varios servidores de Ollama.
+
+    Rutas: `least_outstanding` elige el servidor con menos peticiones en curso;
+    `model_affinity` prefiere el que ya tiene el modelo cargado. Un servidor
+    que falla OLLAMA_MAX_FAILURES veces seguidas queda al final de la lista
+    hasta que el chequeo activo (/api/ps) lo vuelva a ver sano.
+    """
+
+    def __init__(self, base_urls: List[str], routing: str = "least_outstanding",
+                 health_interval: float = 0, max_failures: int = 3):
+        self.backends = [OllamaBackend(url) for url in base_urls]
+        self.routing = routing
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self._health_task: Optional[asyncio.Task] = None
+
+    @property
+    def base_url(self) -> str:
+        return self.backends[0].base_url
+
+    def _ordered(self, model: Optional[str] = None) -> List[OllamaBackend]:
+        """Servidores en orden de preferencia para una petición"""
+        self.start()
+
+        def key(backend: OllamaBackend):
+            affinity = ()
+            if self.routing == "model_affinity" and model:
+                affinity = (
+                    model not in backend.loaded,
+                    bool(backend.available) and model not in backend.available,
+                )
+            latency = backend.latency if backend.latency is not None else float("inf")
+            return (not backend.healthy, *affinity, backend.outstanding, latency)
+
+        return sorted(self.backends, key=key)
+
+    async def _call(self, model: Optional[str], request: Callable[[OllamaClient], Awaitable[Any]]) -> Any:
+        """Ejecutar una petición, reintentando en otro servidor si falla"""
+        last_error: Optional[Exception] = None
+        for backend in self._ordered(model):
+            backend.outstanding += 1
+            backend.requests += 1
+            try:
+                result = await request(backend.client)
+            except Exception as e:
+                if counts_as_failure(e):
+                    backend.mark_failure(e, self.max_failures)
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                continue
+            finally:
+                backend.outstanding -= 1
+            backend.mark_success()
+            if model:
+                backend.loaded.add(model)
+            return result
+        raise last_error
+
+    async def _stream_call(self, model: str, open_stream: Callable[[OllamaClient], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming con reintento en otro servidor mientras no se haya recibido ningún dato"""
+        last_error: Optional[Exception] = None
+        for backend in self._ordered(model):
+            backend.outstanding += 1
+            backend.requests += 1
+            started = False
+            try:
+                async for data in open_stream(backend.client):
+                    if not started:
+                        started = True
+                        backend.mark_success()
+                        backend.loaded.add(model)
+                    yield data
+                return
+            except Exception as e:
+                if counts_as_failure(e):
+                    backend.mark_failure(e, self.max_failures)
+                if started or not is_retryable(e):
+                    raise
+                last_error = e
+            finally:
+                backend.outstanding -= 1
+        raise last_error
+
+    async def list_models(self) -> List[Dict[str, Any]]:
+        """Unión de los modelos de todos los servidores que responden"""
+        self.start()
+        results = await asyncio.gather(*(b.client.list_models() for b in self.backends), return_exceptions=True)
+        models: Dict[str, Dict[str, Any]] = {}
+        errors: List[BaseException] = []
+        for backend, result in zip(self.backends, results):
+            if isinstance(result, BaseException):
+                if isinstance(result, Exception) and counts_as_failure(result):
+                    backend.mark_failure(result, self.max_failures)
+                errors.append(result)
+                continue
+            backend.mark_success()
+            backend.available = {model["name"] for model in result}
+            for model in result:
+                models.setdefault(model["name"], model)
+        if errors and len(errors) == len(self.backends):
+            raise errors[0]
+        return list(models.values())
+
+    async def list_running(self) -> List[Dict[str, Any]]:
+        """Modelos cargados en el servidor preferido"""
+        return await self._call(None, lambda client: client.list_running())
+
+    async def generate(self, model: str, prompt: str, **options: Any) -> Dict[str, Any]:
+        return await self._call(model, lambda client: client.generate(model, prompt, **options))
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], **options: Any) -> Dict[str, Any]:
+        return await self._call(model, lambda client: client.chat(model, messages, **options))
+
+    def stream_generate(self, model: str, prompt: str, **options: Any) -> AsyncIterator[Dict[str, Any]]:
+        return self._stream_call(model, lambda client: client.stream_generate(model, prompt, **options))
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], **options: Any) -> AsyncIterator[Dict[str, Any]]:
+        return self._stream_call(model, lambda client: client.stream_chat(model, messages, **options))
+
+    async def embed(self, model: str, inputs: List[str]) -> List[List[float]]:
+        return await self._call(model, lambda client: client.embed(model, inputs))
+
+    async def preload(self, model: str) -> Dict[str, Optional[str]]:
+        """Cargar el modelo en todos los servidores a la vez; error de cada uno (None = cargado)"""
+        self.start()
+        results = await asyncio.gather(*(b.client.load(model) for b in self.backends), return_exceptions=True)
+        errors: Dict[str, Optional[str]] = {}
+        for backend, result in zip(self.backends, results):
+            if isinstance(result, BaseException):
+                if isinstance(result, Exception) and counts_as_failure(result):
+                    backend.mark_failure(result, self.max_failures)
+                errors[backend.base_url] = str(result) or result.__class__.__name__
+                continue
+            backend.mark_success()
+            backend.loaded.add(model)
+            errors[backend.base_url] = None
+        return errors
+
+    def is_available(self) -> bool:
+        """Algún servidor sano según los últimos chequeos y peticiones"""
+        return any(backend.healthy for backend in self.backends)
+
+    async def check(self, backend: OllamaBackend):
+        """Chequeo activo: latencia y modelos cargados vía /api/ps"""
+        started = time.monotonic()
+        try:
+            running = await backend.client.list_running()
+        except Exception as e:
+            backend.healthy = False
+            backend.last_error = str(e) or e.__class__.__name__
+        else:
+            backend.latency = time.monotonic() - started
+            backend.loaded = {model["name"] for model in running}
+            backend.mark_success()
+        backend.checked_at = time.time()
+
+    async def check_all(self):
+        """Chequear todos los servidores en paralelo"""
+        await asyncio.gather(*(self.check(backend) for backend in self.backends))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        """Iniciar los chequeos activos en segundo plano (una sola vez)"""
+        if self.health_interval > 0 and (self._health_task is None or self._health_task.done()):
+            # Contexto vacío: la tarea no debe heredar el ID de la petición que la inició
+            loop = asyncio.get_running_loop()
+            self._health_task = contextvars.Context().run(loop.create_task, self._health_loop())
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Estado de cada servidor"""
+        return [backend.stats() for backend in self.backends]
+
+    async def aclose(self):
+        """Detener los chequeos y cerrar los pools de conexiones"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for backend in self.backends:
+            await backend.client.aclose()
+
+
+# Instancia global del cliente (un pool con uno o más servidores)
+ollama_client = OllamaPool(
+    config.get_ollama_base_urls(),
+    config.OLLAMA_ROUTING,
+    config.OLLAMA_HEALTH_INTERVAL,
+    config.OLLAMA_MAX_FAILURES,
+)
@@ -0,0 +1,157 @@
+"""
+Construcción de prompts con presupuesto de tokens por modelo
+"""
+import re
+from typing import Dict, List, Optional
+
+# Palabras y signos sueltos: aproxima mejor el tokenizador BPE que contar caracteres
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+OUTLINE_PATTERN = re.compile(r"^\s*(?:async\s+def|def|class|function|export|public|private|func|fn|interface|type)\b")
+
+# Por debajo de esto no vale la pena incluir un fragmento truncado
+MIN_SECTION_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimar tokens: una palabra corta o signo ≈ 1 token, palabras largas ≈ 4 caracteres por token"""
+    count = 0
+    for piece in TOKEN_PATTERN.findall(text):
+        count += 1 if len(piece) <= 4 else (len(piece) + 3) // 4
+    return count
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Recortar un texto al presupuesto, resumiendo lo omitido con un esquema de definiciones"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.splitlines()
+    marker_budget = max_tokens // 4
+    head: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens - marker_budget:
+            break
+        head.append(line)
+        used += cost
+
+    omitted = lines[len(head):]
+    outline: List[str] = []
+    for line in omitted:
+        if OUTLINE_PATTERN.match(line):
+            cost = estimate_tokens(line) + 1
+            if used + cost > max_tokens - 16:
+                break
+            outline.append(line)
+            used += cost
+
+    summary = f"... [{len(omitted)} líneas omitidas"
+    summary += "; definiciones:]" if outline else "]"
+    return "\n".join(head + [summary] + outline)
+
+
+class PromptSection:
+    """Sección del prompt; menor prioridad = más importante"""
+
+    __slots__ = ("name", "text", "priority", "required", "role")
+
+    def __init__(self, name: str, text: str, priority: int, required: bool, role: str = "user"):
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.required = required
+        self.role = role
+
+
+class BuiltPrompt:
+    """Resultado de PromptBuilder.build"""
+
+    def __init__(self, sections: List[PromptSection], usage: Dict[str, int], budget: int, truncated: List[str], dropped: List[str]):
+        self.sections = sections
+        self.usage = usage
+        self.budget = budget
+        self.truncated = truncated
+        self.dropped = dropped
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.usage.values())
+
+    def text(self, separator: str = "\n\n") -> str:
+        """Prompt final como un único texto"""
+        return separator.join(section.text for section in self.sections)
+
+    def messages(self, separator: str = "\n\n") -> List[Dict[str, str]]:
+        """Prompt como mensajes de /api/chat, uniendo secciones consecutivas del mismo rol"""
+        messages: List[Dict[str, str]] = []
+        for section in self.sections:
+            if messages and messages[-1]["role"] == section.role:
+                messages[-1]["content"] += separator + section.text
+            else:
+                messages.append({"role": section.role, "content": section.text})
+        return messages
+
+    def get(self, name: str) -> Optional[str]:
+        """Texto de una sección incluida"""
+        for section in self.sections:
+            if section.name == name:
+                return section.text
+        return None
+
+    def describe(self) -> str:
+        """Resumen de tokens por sección para los logs"""
+        parts = [f"{name}={tokens}" for name, tokens in self.usage.items()]
+        summary = f"{self.total_tokens}/{self.budget} tokens ({', '.join(parts)})"
+        if self.truncated:
+            summary += f", truncadas: {self.truncated}"
+        if self.dropped:
+            summary += f", omitidas: {self.dropped}"
+        return summary
+
+
+class PromptBuilder:
+    """Ensambla secciones respetando un presupuesto de tokens"""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._sections: List[PromptSection] = []
+
+    def add(self, name: str, text: str, priority: int = 0, required: bool = False, role: str = "user") -> "PromptBuilder":
+        """Agregar una sección (las obligatorias nunca se omiten)"""
+        if text:
+            self._sections.append(PromptSection(name, text, priority, required, role))
+        return self
+
+    def build(self) -> BuiltPrompt:
+        """Incluir secciones por prioridad, truncando o descartando las que no caben"""
+        costs = {id(section): estimate_tokens(section.text) for section in self._sections}
+        remaining = self.budget - sum(costs[id(s)] for s in self._sections if s.required)
+
+        included: Dict[int, PromptSection] = {id(s): s for s in self._sections if s.required}
+        truncated: List[str] = []
+        dropped: List[str] = []
+
+        optional = sorted((s for s in self._sections if not s.required), key=lambda s: s.priority)
+        for section in optional:
+            cost = costs[id(section)]
+            if cost <= remaining:
+                included[id(section)] = section
+                remaining -= cost
+            elif remaining >= MIN_SECTION_TOKENS:
+                text = truncate_to_tokens(section.text, remaining)
+                costs[id(section)] = estimate_tokens(text)
+                included[id(section)] = PromptSection(section.name, text, section.priority, False, section.role)
+                truncated.append(section.name)
+                remaining -= costs[id(section)]
+            else:
+                dropped.append(section.name)
+
+        # Mantener el orden en que se agregaron las secciones
+        sections: List[PromptSection] = []
+        usage: Dict[str, int] = {}
+        for section in self._sections:
+            if id(section) in included:
+                sections.append(included[id(section)])
+                usage[section.name] = usage.get(section.name, 0) + costs[id(section)]
+        return BuiltPrompt(sections, usage, self.budget, truncated, dropped)
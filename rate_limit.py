@@ -0,0 +1,251 @@
+"""
+Limitador de peticiones por token bucket (por cliente y por IP), en memoria o SQLite
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import config
+
+RATE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(second|minute|hour|day)\s*$", re.IGNORECASE)
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Rate(NamedTuple):
+    """Capacidad del bucket (ráfaga máxima) y tokens repuestos por segundo"""
+    capacity: float
+    per_second: float
+
+
+def parse_rate(spec: str) -> Rate:
+    """Interpretar "100/minute", "5/second", "1000/hour" o "10000/day" """
+    match = RATE_PATTERN.match(spec or "")
+    if not match:
+        raise ValueError(f"Límite inválido: {spec!r} (se espera p. ej. '100/minute')")
+    count = float(match.group(1))
+    if count <= 0:
+        raise ValueError(f"Límite inválido: {spec!r} (debe ser mayor que 0)")
+    return Rate(count, count / PERIODS[match.group(2).lower()])
+
+
+class RateLimitExceeded(Exception):
+    """Se agotó el bucket; `retry_after` indica en cuántos segundos habrá un token"""
+
+    def __init__(self, retry_after: float, key: str):
+        self.retry_after = retry_after
+        self.key = key
+        super().__init__(f"Límite de peticiones superado para {key}; reintentar en {retry_after:.1f} s")
+
+
+def _refill(tokens: float, updated: float, rate: Rate, now: float) -> float:
+    return min(rate.capacity, tokens + (now - updated) * rate.per_second)
+
+
+def _wait_time(tokens: float, cost: float, rate: Rate) -> float:
+    return (cost - tokens) / rate.per_second
+
+
+class MemoryRateLimitBackend:
+    """Buckets en memoria del proceso; cada consulta es O(1)"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # key -> [tokens, actualizado, momento en que vuelve a estar lleno]; orden = último uso
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def consume(self, limits: Sequence[Tuple[str, Rate]], cost: float = 1.0) -> Tuple[float, Optional[str]]:
+        """Descontar `cost` de todos los buckets, o de ninguno si alguno no alcanza"""
+        now = time.monotonic()
+        self._evict(now)
+
+        levels = []
+        retry_after, blocked = 0.0, None
+        for key, rate in limits:
+            bucket = self._buckets.get(key)
+            tokens = rate.capacity if bucket is None else _refill(bucket[0], bucket[1], rate, now)
+            levels.append(tokens)
+            if tokens < cost and _wait_time(tokens, cost, rate) > retry_after:
+                retry_after, blocked = _wait_time(tokens, cost, rate), key
+        if blocked is not None:
+            return retry_after, blocked
+
+        for (key, rate), tokens in zip(limits, levels):
+            remaining = tokens - cost
+            self._buckets[key] = [remaining, now, now + (rate.capacity - remaining) / rate.per_second]
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return 0.0, None
+
+    def _evict(self, now: float):
+        # Un bucket lleno equivale a uno inexistente: se descartan los inactivos desde el más antiguo
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[2] > now:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SqliteRateLimitBackend:
+    """Buckets en SQLite: los workers del mismo host comparten el límite"""
+
+    name = "sqlite"
+    blocking = True
+    # El tope de buckets se comprueba cada tantas consultas, no en cada mensaje
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._calls = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS rate_buckets_full_at ON rate_buckets (full_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS rate_buckets_updated_at ON rate_buckets (updated_at)")
+
+    def consume(self, limits: Sequence[Tuple[str, Rate]], cost: float = 1.0) -> Tuple[float, Optional[str]]:
+        """Igual que en memoria, dentro de una transacción que bloquea a los demás workers"""
+        # Reloj de pared: los procesos no comparten time.monotonic()
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,))
+                levels = []
+                retry_after, blocked = 0.0, None
+                for key, rate in limits:
+                    row = self._db.execute(
+                        "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+                    ).fetchone()
+                    tokens = rate.capacity if row is None else _refill(row[0], row[1], rate, now)
+                    levels.append(tokens)
+                    if tokens < cost and _wait_time(tokens, cost, rate) > retry_after:
+                        retry_after, blocked = _wait_time(tokens, cost, rate), key
+                if blocked is None:
+                    for (key, rate), tokens in zip(limits, levels):
+                        remaining = tokens - cost
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                            (key, remaining, now, now + (rate.capacity - remaining) / rate.per_second),
+                        )
+                    self._calls += 1
+                    if self._calls % self.PRUNE_EVERY == 0:
+                        self._prune()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return retry_after, blocked
+
+    def _prune(self):
+        # Solo borra si se superó el tope; los más antiguos salen por el índice de updated_at
+        excess = self._db.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM rate_buckets WHERE key IN ("
+                "SELECT key FROM rate_buckets ORDER BY updated_at LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+
+
+class RateLimiter:
+    """Aplica un límite por cliente y otro por IP a cada pregunta"""
+
+    def __init__(self, backend, client_rate: Rate, ip_rate: Rate, enabled: bool = True):
+        self.backend = backend
+        self.client_rate = client_rate
+        self.ip_rate = ip_rate
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited = 0
+
+    def _limits(self, client_id: Optional[str], ip: Optional[str]) -> List[Tuple[str, Rate]]:
+        limits = []
+        if client_id:
+            limits.append((f"client:{client_id}", self.client_rate))
+        if ip:
+            limits.append((f"ip:{ip}", self.ip_rate))
+        return limits
+
+    def _record(self, result: Tuple[float, Optional[str]]):
+        retry_after, blocked = result
+        if blocked is not None:
+            self.limited += 1
+            raise RateLimitExceeded(retry_after, blocked)
+        self.allowed += 1
+
+    def max_cost(self) -> float:
+        """Coste máximo que cabe en una petición: la capacidad del bucket más pequeño"""
+        return min(self.client_rate.capacity, self.ip_rate.capacity) if self.enabled else float("inf")
+
+    def hit(self, client_id: Optional[str] = None, ip: Optional[str] = None, cost: float = 1.0):
+        """Versión síncrona (servidores sin event loop); lanza RateLimitExceeded"""
+        limits = self._limits(client_id, ip)
+        if self.enabled and limits:
+            self._record(self.backend.consume(limits, cost))
+
+    async def acquire(self, client_id: Optional[str] = None, ip: Optional[str] = None, cost: float = 1.0):
+        """Consumir un token de cada bucket; lanza RateLimitExceeded si alguno está vacío"""
+        limits = self._limits(client_id, ip)
+        if not self.enabled or not limits:
+            return
+        if self.backend.blocking:
+            result = await asyncio.to_thread(self.backend.consume, limits, cost)
+        else:
+            result = self.backend.consume(limits, cost)
+        self._record(result)
+
+    def stats(self) -> Dict[str, object]:
+        """Información del limitador"""
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "buckets": len(self.backend),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str] = None) -> Optional[str]:
+    """IP del cliente; X-Forwarded-For solo se usa detrás de un proxy de confianza"""
+    if config.RATE_LIMIT_TRUST_PROXY and forwarded_for:
+        return forwarded_for.split(",")[0].strip() or peer
+    return peer
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Crear el limitador según la configuración"""
+    if config.RATE_LIMIT_BACKEND == "sqlite":
+        backend = SqliteRateLimitBackend(config.RATE_LIMIT_DB, config.RATE_LIMIT_MAX_BUCKETS)
+    else:
+        backend = MemoryRateLimitBackend(config.RATE_LIMIT_MAX_BUCKETS)
+    client_rate = parse_rate(config.RATE_LIMIT)
+    ip_rate = parse_rate(config.RATE_LIMIT_PER_IP) if config.RATE_LIMIT_PER_IP else client_rate
+    return RateLimiter(backend, client_rate, ip_rate, enabled=config.RATE_LIMIT_ENABLED)
+
+
+# Instancia global del limitador
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,123 @@
+"""
+Repositorio conectado: handle de GitHub, instantánea e índices precargados, compartido entre sesiones
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import config
+from embeddings import semantic_store
+from repo_snapshot import RepoSnapshot, snapshot_store
+from retrieval import Bm25Index, index_store
+
+logger = logging.getLogger(__name__)
+
+
+class RepoContext:
+    """Prepara un repositorio una sola vez, fuera del camino de las preguntas"""
+
+    def __init__(self, full_name: str):
+        self.full_name = full_name
+        self.repo = None
+        self.error: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> Optional[RepoSnapshot]:
+        """Instantánea local más reciente del repositorio"""
+        return snapshot_store.get(self.full_name)
+
+    @property
+    def index(self) -> Optional[Bm25Index]:
+        """Índice BM25 de la instantánea"""
+        return index_store.get(self.full_name) if self.snapshot else None
+
+    def warm_up(self, github_client) -> asyncio.Task:
+        """Iniciar (una sola vez) la carga del repositorio en segundo plano"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._load(github_client))
+            self._task.add_done_callback(self._log_failure)
+        return self._task
+
+    def refresh(self, github_client):
+        """Recargar en segundo plano (nuevos commits); mientras tanto se sigue usando la carga anterior"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._load(github_client))
+            self._refresh_task.add_done_callback(self._log_failure)
+
+    @property
+    def failed(self) -> bool:
+        """La primera carga terminó sin repositorio"""
+        return self._task is not None and self._task.done() and self.repo is None
+
+    async def _load(self, github_client) -> "RepoContext":
+        self.repo = await asyncio.to_thread(github_client.get_repo, self.full_name)
+        # Las instantáneas e índices se guardan con el nombre canónico, no con el escrito en la URL
+        self.full_name = self.repo.full_name
+        self.loaded_at = time.monotonic()
+        # Sin instantánea se sigue funcionando con la API de GitHub y su caché
+        try:
+            snapshot = await snapshot_store.sync(self.repo)
+            index = await index_store.update(snapshot)
+            if config.RETRIEVAL_MODE == "semantic":
+                await semantic_store.update(self.full_name, index.chunks())
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            logger.warning("No se pudo descargar la instantánea de %s: %s", self.full_name, e)
+        return self
+
+    def _log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.error = str(task.exception())
+            logger.error("No se pudo cargar el repositorio %s: %s", self.full_name, self.error)
+
+    async def ready(self) -> bool:
+        """Esperar a que termine la carga; una pregunta cancelada no interrumpe la carga"""
+        if self._task is None:
+            return False
+        try:
+            await asyncio.shield(self._task)
+        except Exception:
+            return False
+        return self.repo is not None
+
+
+class RepoContextRegistry:
+    """Un RepoContext por repositorio y proceso, compartido por sesiones, lotes y calentamiento
+
+    Cada repositorio se prepara una sola vez; pasado `ttl` se recarga en segundo
+    plano la próxima vez que se pide, sin que la pregunta espere a GitHub.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._contexts: "OrderedDict[str, RepoContext]" = OrderedDict()
+
+    def get(self, full_name: str, github_client) -> RepoContext:
+        """Contexto compartido del repositorio, cargándolo o refrescándolo si hace falta"""
+        key = full_name.lower()
+        context = self._contexts.get(key)
+        if context is None or context.failed:
+            # Un fallo no se cachea: la siguiente petición vuelve a intentarlo
+            context = RepoContext(full_name)
+            context.warm_up(github_client)
+            self._contexts[key] = context
+        elif context.loaded_at is not None and time.monotonic() - context.loaded_at > self.ttl:
+            context.refresh(github_client)
+        self._contexts.move_to_end(key)
+        while len(self._contexts) > self.max_entries:
+            self._contexts.popitem(last=False)
+        return context
+
+    def stats(self):
+        return {"repos": len(self._contexts), "ttl": self.ttl}
+
+
+# Instancia global de los repositorios preparados en este proceso
+repo_contexts = RepoContextRegistry(config.REPO_CONTEXT_TTL, config.REPO_CONTEXT_MAX_ENTRIES)
@@ -0,0 +1,196 @@
+"""
+Instantánea local de un repositorio de GitHub descargada como tarball
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from config import config
+from intents import PATH_PATTERN, normalize_path
+
+
+class RepoSnapshot:
+    """Archivos de un commit concreto guardados en disco con un índice de rutas"""
+
+    def __init__(self, repo_name: str, sha: str, root: str, files: Dict[str, int], hashes: Dict[str, str]):
+        self.repo_name = repo_name
+        self.sha = sha
+        self.root = root
+        self.files = files
+        self.hashes = hashes
+        self._by_lower: Dict[str, str] = {path.lower(): path for path in files}
+        self._by_name: Dict[str, List[str]] = {}
+        for path in sorted(files):
+            self._by_name.setdefault(os.path.basename(path).lower(), []).append(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.files
+
+    def read(self, path: str) -> str:
+        """Leer un archivo de la instantánea"""
+        with open(os.path.join(self.root, "files", path), "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    def root_files(self) -> List[str]:
+        """Archivos en la raíz del repositorio"""
+        return sorted(path for path in self.files if "/" not in path)
+
+    def resolve_mentions(self, message: str) -> List[str]:
+        """Encontrar los archivos del repositorio mencionados en un mensaje"""
+        return self.resolve_paths(PATH_PATTERN.findall(message))
+
+    def resolve_paths(self, candidates: Iterable[str]) -> List[str]:
+        """Resolver rutas mencionadas (completas o solo el nombre) contra el índice"""
+        found: List[str] = []
+        for candidate in candidates:
+            candidate = normalize_path(candidate)
+            if candidate in self._by_lower:
+                matches = [self._by_lower[candidate]]
+            else:
+                matches = self._by_name.get(os.path.basename(candidate), [])
+            for path in matches:
+                if path not in found:
+                    found.append(path)
+        return found
+
+
+class SnapshotStore:
+    """Descarga y mantiene una instantánea por repositorio"""
+
+    def __init__(self, base_dir: str, max_file_bytes: int, retention: float):
+        self.base_dir = base_dir
+        self.max_file_bytes = max_file_bytes
+        self.retention = retention
+        self._snapshots: Dict[str, RepoSnapshot] = {}
+        # Una sincronización por repositorio a la vez: comparten el mismo directorio en disco
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def get(self, repo_name: str) -> Optional[RepoSnapshot]:
+        """Obtener la instantánea ya cargada de un repositorio"""
+        return self._snapshots.get(repo_name)
+
+    def _repo_dir(self, repo_name: str) -> str:
+        return os.path.join(self.base_dir, repo_name.replace("/", "__"))
+
+    async def sync(self, repo) -> RepoSnapshot:
+        """Asegurar una instantánea del último commit de la rama principal"""
+        branch = await asyncio.to_thread(repo.get_branch, repo.default_branch)
+        sha = branch.commit.sha
+
+        lock = self._locks.setdefault(repo.full_name, asyncio.Lock())
+        async with lock:
+            # Otra sincronización pudo dejar este commit listo mientras esperábamos
+            snapshot = self._snapshots.get(repo.full_name)
+            if not snapshot or snapshot.sha != sha:
+                root = os.path.join(self._repo_dir(repo.full_name), sha)
+                index_file = os.path.join(root, "index.json")
+                if not os.path.exists(index_file):
+                    await self._download(repo, sha, root)
+
+                with open(index_file, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+
+                snapshot = RepoSnapshot(repo.full_name, sha, root, index["files"], index.get("hashes", {}))
+                self._snapshots[repo.full_name] = snapshot
+            # En cada sincronización: los commits anteriores caducan aunque este no cambie
+            await asyncio.to_thread(self._prune, repo.full_name, sha)
+            return snapshot
+
+    async def _download(self, repo, sha: str, root: str):
+        """Descargar el tarball del commit y desempaquetarlo en disco"""
+        os.makedirs(self._repo_dir(repo.full_name), exist_ok=True)
+        headers = {"Authorization": f"token {config.GITHUB_TOKEN}"} if config.GITHUB_TOKEN else {}
+
+        fd, archive_path = tempfile.mkstemp(suffix=".tar.gz", dir=self._repo_dir(repo.full_name))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with httpx.AsyncClient(timeout=config.GITHUB_TIMEOUT, follow_redirects=True) as client:
+                    async with client.stream("GET", f"{repo.url}/tarball/{sha}", headers=headers) as response:
+                        response.raise_for_status()
+                        async for block in response.aiter_bytes():
+                            f.write(block)
+            await asyncio.to_thread(self._extract, archive_path, root)
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+
+    def _extract(self, archive_path: str, root: str):
+        # Directorio temporal único: otro proceso puede estar extrayendo el mismo commit
+        tmp_root = tempfile.mkdtemp(prefix=f"{os.path.basename(root)}.", suffix=".tmp", dir=os.path.dirname(root))
+        try:
+            self._extract_into(archive_path, tmp_root)
+            if os.path.exists(os.path.join(root, "index.json")):
+                return  # Otro proceso terminó antes la misma instantánea
+            shutil.rmtree(root, ignore_errors=True)
+            os.replace(tmp_root, root)
+        finally:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+
+    def _extract_into(self, archive_path: str, tmp_root: str):
+        files_dir = os.path.join(tmp_root, "files")
+        files: Dict[str, int] = {}
+        hashes: Dict[str, str] = {}
+
+        with tarfile.open(archive_path, "r:gz") as tar:
+            for member in tar:
+                if not member.isfile() or member.size > self.max_file_bytes:
+                    continue
+                # GitHub añade un directorio "<owner>-<repo>-<sha>/" a todas las rutas
+                parts = member.name.split("/", 1)
+                if len(parts) < 2 or not parts[1]:
+                    continue
+                path = os.path.normpath(parts[1]).replace(os.sep, "/")
+                if path.startswith("..") or os.path.isabs(path):
+                    continue
+
+                data = tar.extractfile(member).read()
+                if b"\0" in data[:8192]:
+                    continue  # Archivo binario
+
+                target = os.path.join(files_dir, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    f.write(data)
+                files[path] = member.size
+                hashes[path] = hashlib.sha1(data).hexdigest()
+
+        with open(os.path.join(tmp_root, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"files": files, "hashes": hashes}, f)
+
+    def _prune(self, repo_name: str, keep_sha: str):
+        """Eliminar instantáneas de commits anteriores (no las extracciones en curso, *.tmp)
+
+        El directorio es compartido: otros workers pueden seguir leyendo un commit
+        anterior hasta su próxima sincronización. Solo se borran los anteriores al
+        actual, y solo cuando el actual lleva más de `retention` segundos en disco.
+        """
+        repo_dir = self._repo_dir(repo_name)
+        try:
+            kept_at = os.path.getmtime(os.path.join(repo_dir, keep_sha, "index.json"))
+        except OSError:
+            return
+        if time.time() - kept_at < self.retention:
+            return
+        for entry in os.listdir(repo_dir):
+            path = os.path.join(repo_dir, entry)
+            if entry == keep_sha or entry.endswith(".tmp") or not os.path.isdir(path):
+                continue
+            try:
+                if os.path.getmtime(path) >= kept_at:
+                    continue  # Un commit más reciente que sincronizó otro worker
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Instancia global del almacén de instantáneas
+snapshot_store = SnapshotStore(config.REPO_SNAPSHOT_DIR, config.REPO_SNAPSHOT_MAX_FILE_BYTES,
+                               config.REPO_SNAPSHOT_RETENTION)
@@ -0,0 +1,190 @@
+"""
+Caché opcional de respuestas para prompts idénticos (memoria o SQLite)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from config import config
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s./-]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+REPLAY_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Normalizar una pregunta: minúsculas, sin acentos, sin signos y con espacios colapsados"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = PUNCTUATION_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+class MemoryBackend:
+    """LRU en memoria con expiración por TTL"""
+
+    # Operaciones baratas: se ejecutan directamente en el event loop
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """Caché persistente en SQLite, compartida entre procesos del mismo host"""
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Caché de respuestas por (modelo, prompt normalizado, hash de contexto, opciones)"""
+
+    def __init__(self, enabled: bool, backend):
+        self.enabled = enabled
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, message: str, context: str, options: Dict[str, Any]) -> str:
+        """Clave de caché; el contexto incluye system, historial y archivos del repositorio"""
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        raw = json.dumps([model, normalize_prompt(message), context_hash, options], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Buscar una respuesta guardada"""
+        if not self.enabled:
+            return None
+        if self.backend.blocking:
+            value = await asyncio.to_thread(self.backend.get, key)
+        else:
+            value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        """Guardar una respuesta completa"""
+        if not self.enabled or not value:
+            return
+        if self.backend.blocking:
+            await asyncio.to_thread(self.backend.set, key, value)
+        else:
+            self.backend.set(key, value)
+
+    @staticmethod
+    def replay_chunks(value: str, chunk_size: int = 32) -> Iterator[str]:
+        """Partir una respuesta guardada en trozos para reenviarla como stream"""
+        buffer = ""
+        for word in REPLAY_PATTERN.findall(value):
+            buffer += word
+            if len(buffer) >= chunk_size:
+                yield buffer
+                buffer = ""
+        if buffer:
+            yield buffer
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de la caché"""
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.backend) if self.enabled else 0,
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    """Crear la caché según la configuración"""
+    if not config.RESPONSE_CACHE_ENABLED:
+        return ResponseCache(False, MemoryBackend(0, 0))
+    if config.RESPONSE_CACHE_BACKEND == "sqlite":
+        backend = SqliteBackend(config.RESPONSE_CACHE_DB, config.RESPONSE_CACHE_MAX_ENTRIES, config.RESPONSE_CACHE_TTL)
+    else:
+        backend = MemoryBackend(config.RESPONSE_CACHE_MAX_ENTRIES, config.RESPONSE_CACHE_TTL)
+    return ResponseCache(True, backend)
+
+
+# Instancia global de la caché de respuestas
+response_cache = create_response_cache()
@@ -0,0 +1,227 @@
+"""
+Índice invertido BM25 sobre fragmentos de los archivos del repositorio
+"""
+import asyncio
+import hashlib
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from prompt_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+STOPWORDS = frozenset("""
+a al con de del el en es la las lo los para por que qué se su un una y o como cómo hace
+the a an and or of to in is it for on with what does how this that be
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Separar en términos, partiendo identificadores snake_case y camelCase"""
+    terms = []
+    for word in WORD_PATTERN.findall(text):
+        lower = word.lower()
+        if lower in STOPWORDS:
+            continue
+        terms.append(lower)
+        if "_" in word or not (word.islower() or word.isupper()):
+            for part in word.split("_"):
+                for piece in CAMEL_PATTERN.findall(part):
+                    piece = piece.lower()
+                    if piece != lower and len(piece) > 1:
+                        terms.append(piece)
+    return terms
+
+
+class Chunk:
+    """Fragmento de un archivo (rango de líneas)"""
+
+    __slots__ = ("id", "path", "start_line", "end_line", "text", "length")
+
+    def __init__(self, chunk_id: int, path: str, start_line: int, end_line: int, text: str, length: int):
+        self.id = chunk_id
+        self.path = path
+        self.start_line = start_line
+        self.end_line = end_line
+        self.text = text
+        self.length = length
+
+    def format(self) -> str:
+        """Formato usado dentro del prompt"""
+        return f"--- {self.path} (líneas {self.start_line}-{self.end_line}) ---\n{self.text}\n\n"
+
+
+def chunk_lines(text: str, size: int, overlap: int) -> Iterable[Tuple[int, int, str]]:
+    """Dividir un texto en ventanas de líneas solapadas"""
+    lines = text.splitlines()
+    step = max(1, size - overlap)
+    for start in range(0, max(len(lines), 1), step):
+        window = lines[start:start + size]
+        if not window:
+            break
+        yield start + 1, start + len(window), "\n".join(window)
+        if start + size >= len(lines):
+            break
+
+
+class Bm25Index:
+    """Índice invertido incremental con puntuación BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._chunks: Dict[int, Chunk] = {}
+        self._file_chunks: Dict[str, List[int]] = {}
+        self._file_versions: Dict[str, str] = {}
+        self._total_length = 0
+        self._next_id = 0
+        # Las actualizaciones corren en un hilo mientras se atienden búsquedas
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def version(self, path: str) -> Optional[str]:
+        """Versión indexada de un archivo"""
+        return self._file_versions.get(path)
+
+    def add_file(self, path: str, text: str, version: Optional[str] = None) -> bool:
+        """Indexar (o reindexar) un archivo; devuelve False si no cambió"""
+        version = version or hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if self._file_versions.get(path) == version:
+            return False
+
+        with self._lock:
+            self._add_file(path, text, version)
+        return True
+
+    def _add_file(self, path: str, text: str, version: str):
+        self.remove_file(path)
+        chunk_ids = []
+        for start, end, chunk_text in chunk_lines(text, config.RETRIEVAL_CHUNK_LINES, config.RETRIEVAL_CHUNK_OVERLAP):
+            # La ruta también se indexa para que "config" encuentre config.py
+            terms = Counter(tokenize(f"{path}\n{chunk_text}"))
+            length = sum(terms.values())
+            chunk = Chunk(self._next_id, path, start, end, chunk_text, length)
+            self._next_id += 1
+
+            self._chunks[chunk.id] = chunk
+            self._total_length += length
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[chunk.id] = frequency
+            chunk_ids.append(chunk.id)
+
+        self._file_chunks[path] = chunk_ids
+        self._file_versions[path] = version
+
+    def remove_file(self, path: str):
+        """Eliminar un archivo del índice"""
+        with self._lock:
+            for chunk_id in self._file_chunks.pop(path, []):
+                chunk = self._chunks.pop(chunk_id)
+                self._total_length -= chunk.length
+                for term in set(tokenize(f"{path}\n{chunk.text}")):
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.pop(chunk_id, None)
+                        if not postings:
+                            del self._postings[term]
+            self._file_versions.pop(path, None)
+
+    def chunks(self) -> List[Chunk]:
+        """Todos los fragmentos indexados"""
+        with self._lock:
+            return list(self._chunks.values())
+
+    def paths(self) -> List[str]:
+        """Rutas indexadas"""
+        return list(self._file_versions)
+
+    def search(self, query: str, k: int, paths: Optional[Iterable[str]] = None) -> List[Tuple[float, Chunk]]:
+        """Devolver los k fragmentos con mayor puntuación BM25"""
+        with self._lock:
+            return self._search(query, k, paths)
+
+    def _search(self, query: str, k: int, paths: Optional[Iterable[str]]) -> List[Tuple[float, Chunk]]:
+        if not self._chunks:
+            return []
+
+        allowed = None
+        if paths is not None:
+            allowed = {chunk_id for path in paths for chunk_id in self._file_chunks.get(path, [])}
+
+        total = len(self._chunks)
+        average_length = self._total_length / total
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                if allowed is not None and chunk_id not in allowed:
+                    continue
+                length = self._chunks[chunk_id].length
+                norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self._chunks[chunk_id]) for chunk_id, score in best]
+
+    def select(self, query: str, k: int, token_budget: int, paths: Optional[Iterable[str]] = None) -> List[Chunk]:
+        """Elegir los mejores fragmentos sin exceder el presupuesto de tokens"""
+        selected = []
+        used = 0
+        for _, chunk in self.search(query, k, paths):
+            cost = estimate_tokens(chunk.text)
+            if used + cost > token_budget:
+                continue
+            selected.append(chunk)
+            used += cost
+        return selected
+
+
+class IndexStore:
+    """Mantiene un índice BM25 por repositorio, actualizado de forma incremental"""
+
+    def __init__(self):
+        self._indexes: Dict[str, Bm25Index] = {}
+
+    def get(self, repo_name: str) -> Optional[Bm25Index]:
+        """Obtener el índice de un repositorio"""
+        return self._indexes.get(repo_name)
+
+    def _update(self, snapshot) -> Tuple[Bm25Index, int]:
+        index = self._indexes.get(snapshot.repo_name) or Bm25Index()
+        changed = 0
+        for path in set(index.paths()) - set(snapshot.files):
+            index.remove_file(path)
+            changed += 1
+        for path in snapshot.files:
+            version = snapshot.hashes.get(path)
+            if version and index.version(path) == version:
+                continue
+            if index.add_file(path, snapshot.read(path), version):
+                changed += 1
+        self._indexes[snapshot.repo_name] = index
+        return index, changed
+
+    async def update(self, snapshot) -> Bm25Index:
+        """Reindexar solo los archivos que cambiaron en la instantánea"""
+        index, changed = await asyncio.to_thread(self._update, snapshot)
+        logger.info("Índice de %s: %d fragmentos (%d archivos actualizados)", snapshot.repo_name, len(index), changed)
+        return index
+
+
+# Instancia global de índices
+index_store = IndexStore()
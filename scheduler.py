@@ -0,0 +1,118 @@
+"""
+Planificador de generaciones: límite de concurrencia y cola FIFO acotada
+"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+from config import config
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """La cola de generaciones está llena"""
+
+    def __init__(self, queued: int):
+        self.queued = queued
+        super().__init__(f"Cola de generaciones llena ({queued} en espera)")
+
+
+class _Waiter:
+    """Petición en espera de un hueco"""
+
+    __slots__ = ("granted", "wake")
+
+    def __init__(self):
+        self.granted = False
+        self.wake: Optional[asyncio.Future] = None
+
+    def notify(self):
+        if self.wake is not None and not self.wake.done():
+            self.wake.set_result(None)
+
+
+class GenerationScheduler:
+    """Deja pasar como máximo `max_in_flight` generaciones; el resto espera en orden de llegada"""
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: Deque[_Waiter] = deque()
+
+    async def acquire(self, on_position: Optional[PositionCallback] = None):
+        """Obtener un hueco, avisando la posición en la cola mientras se espera"""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        # Rechazar enseguida en lugar de acumular esperas sin límite
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(len(self._waiters))
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter()
+        self._waiters.append(waiter)
+        try:
+            reported = 0
+            while not waiter.granted:
+                waiter.wake = loop.create_future()
+                position = self._waiters.index(waiter) + 1
+                if on_position and position != reported:
+                    reported = position
+                    await on_position(position)
+                await waiter.wake
+        except BaseException:
+            if waiter.granted:
+                # El hueco ya se nos había cedido: pasarlo al siguiente
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+                self._notify_waiters()
+            raise
+        self.admitted += 1
+
+    def release(self):
+        """Liberar un hueco, cediéndolo directamente al primero de la cola"""
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            waiter.notify()
+            self._notify_waiters()
+        else:
+            self.in_flight -= 1
+
+    def _notify_waiters(self):
+        """Despertar a los que esperan para que informen su nueva posición"""
+        for waiter in self._waiters:
+            waiter.notify()
+
+    @asynccontextmanager
+    async def slot(self, on_position: Optional[PositionCallback] = None) -> AsyncIterator[None]:
+        """Ejecutar un bloque ocupando un hueco del planificador"""
+        await self.acquire(on_position)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Estado actual del planificador"""
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+# Instancia global del planificador
+generation_scheduler = GenerationScheduler(config.MAX_CONCURRENT_GENERATIONS, config.GENERATION_QUEUE_SIZE)
@@ -0,0 +1,62 @@
+"""
+Serialización JSON: usa orjson si está instalado y, si no, la librería estándar
+"""
+import json
+from typing import Any, AsyncIterator, Union
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# Prefijo ya codificado de los mensajes response_chunk: solo se serializa el texto
+CHUNK_FRAME_PREFIX = '{"type":"response_chunk","content":'
+
+
+if orjson is not None:
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decodificar JSON desde bytes o texto"""
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> str:
+        """Codificar un objeto como texto JSON compacto"""
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    _decoder = json.JSONDecoder()
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decodificar JSON desde bytes o texto"""
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return _decoder.decode(data)
+
+    def dumps(obj: Any) -> str:
+        """Codificar un objeto como texto JSON compacto"""
+        return _encoder.encode(obj)
+
+
+def encode_chunk_frame(content: str) -> str:
+    """Mensaje response_chunk usando la plantilla precodificada"""
+    return CHUNK_FRAME_PREFIX + dumps(content) + "}"
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Decodificar un stream NDJSON directamente desde bytes, ignorando líneas inválidas"""
+    pending = b""
+    async for data in chunks:
+        lines = (pending + data).split(b"\n") if pending else data.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                try:
+                    yield loads(line)
+                except ValueError:
+                    continue
+    if pending.strip():
+        try:
+            yield loads(pending)
+        except ValueError:
+            pass
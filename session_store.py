@@ -0,0 +1,159 @@
+"""
+Almacén de estado de sesiones (memoria o SQLite) compartible entre workers
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import config
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def new_session_id() -> str:
+    """Generar un identificador de sesión"""
+    return uuid.uuid4().hex
+
+
+def is_valid_session_id(session_id: Optional[str]) -> bool:
+    """Comprobar que un identificador enviado por el cliente es utilizable"""
+    return bool(session_id) and SESSION_ID_PATTERN.match(session_id) is not None
+
+
+class MemorySessionBackend:
+    """Sesiones en memoria del proceso, con expiración por inactividad"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        expires_at, state = entry
+        if expires_at < time.time():
+            del self._entries[session_id]
+            return None
+        return state
+
+    def set(self, session_id: str, state: Dict[str, Any]):
+        self._entries[session_id] = (time.time() + self.ttl, state)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, session_id: str):
+        self._entries.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteSessionBackend:
+    """Sesiones en SQLite: visibles para todos los workers del mismo host"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id: str, state: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state, ensure_ascii=False), now),
+            )
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                "SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    """Guarda el estado serializable de cada sesión (repositorio activo e historial)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Estado guardado de una sesión, o None si no existe o expiró"""
+        return await self._call(self.backend.get, session_id)
+
+    async def save(self, session_id: str, state: Dict[str, Any]):
+        """Guardar el estado de una sesión"""
+        await self._call(self.backend.set, session_id, state)
+
+    async def delete(self, session_id: str):
+        """Olvidar una sesión"""
+        await self._call(self.backend.delete, session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Información del almacén"""
+        return {
+            "backend": self.backend.name,
+            "sessions": len(self.backend),
+        }
+
+
+def create_session_store() -> SessionStore:
+    """Crear el almacén según la configuración"""
+    if config.SESSION_STORE_BACKEND == "sqlite":
+        backend = SqliteSessionBackend(config.SESSION_STORE_DB, config.SESSION_MAX_ENTRIES, config.SESSION_TTL)
+    else:
+        backend = MemorySessionBackend(config.SESSION_MAX_ENTRIES, config.SESSION_TTL)
+    return SessionStore(backend)
+
+
+# Instancia global del almacén de sesiones
+session_store = create_session_store()
@@ -0,0 +1,105 @@
+"""
+Coalescencia (single-flight) de generaciones idénticas en curso
+"""
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+
+class Flight:
+    """Una generación en curso compartida por varios suscriptores"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        """Agregar un trozo y despertar a los suscriptores"""
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Marcar la generación como terminada (con o sin error)"""
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Reproducir los trozos ya recibidos y seguir los nuevos"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Comparte un único stream upstream entre peticiones con la misma clave"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def stream(self, key: str, producer: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Suscribirse a la generación de `key`, iniciándola con `producer` si no existe"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, producer))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        flight.subscribers += 1
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nadie más espera esta respuesta: abortar el stream upstream
+                flight.cancelled = True
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: str, flight: Flight, producer: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in producer():
+                flight.publish(chunk)
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de generaciones iniciadas y compartidas"""
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+# Instancia global de coalescencia
+single_flight = SingleFlight()
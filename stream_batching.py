@@ -0,0 +1,74 @@
+"""
+Agrupación de trozos de streaming en ventanas de tiempo o tamaño
+"""
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from config import config
+
+
+async def batch_chunks(
+    chunks: AsyncIterator[str],
+    interval: Optional[float] = None,
+    max_chars: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """Unir trozos consecutivos: se envía un lote al cumplirse la ventana o al llegar a `max_chars`.
+
+    El primer trozo sale de inmediato para no retrasar el primer token; si el
+    modelo genera más lento que la ventana, cada token sigue saliendo solo.
+    """
+    interval = config.STREAM_FLUSH_INTERVAL if interval is None else interval
+    max_chars = config.STREAM_FLUSH_MAX_CHARS if max_chars is None else max_chars
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+
+    buffer: List[str] = []
+    size = 0
+    deadline = 0.0
+    first = True
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(0.0, deadline - loop.time()) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Venció la ventana: enviar lo acumulado sin abandonar la lectura en curso
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                continue
+
+            future, pending = pending, None
+            try:
+                chunk = future.result()
+            except StopAsyncIteration:
+                break
+
+            if first:
+                first = False
+                yield chunk
+                continue
+
+            if not buffer:
+                deadline = loop.time() + interval
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= max_chars or loop.time() >= deadline:
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.wait({pending})
+            if not pending.cancelled():
+                pending.exception()
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
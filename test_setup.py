@@ -45,7 +45,7 @@ def test_dependencies():
     print_header("Verificando Dependencias")
     
     required_packages = [
-        "fastapi", "uvicorn", "requests", "python-dotenv", 
+        "fastapi", "uvicorn", "requests", "httpx", "numpy", "python-dotenv", 
         "PyGithub", "aiofiles", "jinja2", "websockets"
     ]
     
@@ -0,0 +1,138 @@
+"""
+Calentamiento al arrancar y estado de preparación (readiness) de la instancia
+
+Los pasos (validar la configuración, cargar el modelo en Ollama, descargar un
+repositorio) se ejecutan en segundo plano mientras el servidor ya acepta
+conexiones: /api/live responde desde el primer momento y /api/ready solo
+cuando los pasos obligatorios han terminado bien, para que el balanceador no
+envíe tráfico a una instancia que todavía paga la carga del modelo.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Sequence
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupStep(NamedTuple):
+    """Paso de calentamiento: `run` devuelve un detalle para /api/ready o lanza una excepción"""
+    name: str
+    run: Callable[[], Awaitable[str]]
+    required: bool = True
+    retry: bool = True
+
+
+class WarmupCheck:
+    """Estado de un paso"""
+
+    def __init__(self, step: WarmupStep):
+        self.step = step
+        self.status = "pending"  # pending, running, ok, failed
+        self.detail: Optional[str] = None
+        self.attempts = 0
+        self.elapsed: Optional[float] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.step.required,
+            "detail": self.detail,
+            "attempts": self.attempts,
+            "elapsed": round(self.elapsed, 3) if self.elapsed is not None else None,
+        }
+
+
+class Warmup:
+    """Ejecuta los pasos en paralelo; los obligatorios que fallan se reintentan hasta que salen bien"""
+
+    def __init__(self, retry_interval: float):
+        self.retry_interval = retry_interval
+        self.checks: Dict[str, WarmupCheck] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """Todos los pasos terminados y los obligatorios sin error"""
+        if not self.checks:
+            return False
+        for check in self.checks.values():
+            if check.status in ("pending", "running"):
+                return False
+            if check.step.required and check.status != "ok":
+                return False
+        return True
+
+    def start(self, steps: Sequence[WarmupStep]) -> asyncio.Task:
+        """Iniciar el calentamiento en segundo plano (una sola vez)"""
+        if self._task is None:
+            self.checks = {step.name: WarmupCheck(step) for step in steps}
+            self.started_at = time.time()
+            # Contexto vacío: los logs del calentamiento no llevan el ID de ninguna petición
+            loop = asyncio.get_running_loop()
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+        return self._task
+
+    async def _run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_check(check) for check in self.checks.values()))
+        self.finished_at = time.time()
+        if self.ready:
+            logger.info("Instancia lista en %.1f s", time.perf_counter() - started)
+        else:
+            logger.error("Calentamiento terminado sin estar lista: %s",
+                         {name: check.detail for name, check in self.checks.items() if check.status != "ok"})
+
+    async def _run_check(self, check: WarmupCheck):
+        while True:
+            check.status = "running"
+            check.attempts += 1
+            started = time.perf_counter()
+            try:
+                check.detail = await check.step.run()
+                check.status = "ok"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                check.detail = str(e) or e.__class__.__name__
+                check.status = "failed"
+            finally:
+                check.elapsed = time.perf_counter() - started
+
+            if check.status == "ok":
+                logger.info("Calentamiento %s: %s (%.1f s)", check.step.name, check.detail, check.elapsed)
+                return
+            if not (check.step.required and check.step.retry):
+                level = logging.ERROR if check.step.required else logging.WARNING
+                logger.log(level, "Calentamiento %s falló: %s", check.step.name, check.detail)
+                return
+            logger.warning("Calentamiento %s falló (intento %d), se reintenta en %.0f s: %s",
+                           check.step.name, check.attempts, self.retry_interval, check.detail)
+            await asyncio.sleep(self.retry_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del calentamiento y de cada paso"""
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "checks": {name: check.stats() for name, check in self.checks.items()},
+        }
+
+    async def aclose(self):
+        """Detener el calentamiento si sigue en curso"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+# Instancia global del calentamiento
+warmup = Warmup(config.WARMUP_RETRY_INTERVAL)